@@ -0,0 +1,77 @@
+"""
+Offline load test of the LLM dispatcher against the stub backend.
+
+Simulates a burst of concurrent requests where many users ask the same trending questions, and reports how many
+backend calls were made (coalescing), how many requests were rejected or expired, and the latency percentiles.
+
+Run from the repo root:
+    python -m benchmarks.load_test_llm --requests 200 --distinct 10 --quota 30
+"""
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.qna_with_data.llm_dispatcher import LLMDispatcher, StubBackend, QueueFullError, DeadlineExceededError
+
+
+def run_load_test(requests: int, distinct: int, concurrency: int, latency: float, quota: int, timeout: float, max_queue: int) -> dict:
+    """
+    Fire `requests` completions over `distinct` prompts from `concurrency` threads.
+
+    Returns:
+        dict: Backend calls, outcome counts and latency percentiles (ms) of the successful requests.
+    """
+    backend = StubBackend(latency=latency, quota_per_minute=quota)
+    dispatcher = LLMDispatcher(backend, requests_per_minute=quota, tokens_per_minute=None, max_queue=max_queue)
+    prompts = [f"Question {i}: what was the cancellation rate of segment {i}?" for i in range(distinct)]
+    rng = np.random.default_rng(0)
+    # Zipf-like popularity: a few trending questions get most of the traffic
+    weights = 1 / np.arange(1, distinct + 1)
+    picks = rng.choice(distinct, requests, p=weights / weights.sum())
+
+    def one_request(i):
+        start = time.perf_counter()
+        try:
+            dispatcher.complete(prompts[picks[i]], "stub", priority=i % 2, timeout=timeout)
+            return "ok", time.perf_counter() - start
+        except QueueFullError:
+            return "rejected", None
+        except DeadlineExceededError:
+            return "expired", None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(one_request, range(requests)))
+
+    latencies = np.array([t for status, t in outcomes if t is not None]) * 1000
+    counts = {status: sum(1 for s, _ in outcomes if s == status) for status in ("ok", "rejected", "expired")}
+    return {
+        "requests": requests,
+        "backend_calls": backend.calls,
+        **counts,
+        "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+        "p95_ms": float(np.percentile(latencies, 95)) if len(latencies) else None,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Total number of requests.")
+    parser.add_argument("--distinct", type=int, default=10, help="Number of distinct prompts.")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent clients.")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub completion latency in seconds.")
+    parser.add_argument("--quota", type=int, default=30, help="Requests per minute of the (stub) provider.")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request dispatch deadline in seconds.")
+    parser.add_argument("--max-queue", type=int, default=64, help="Dispatcher queue size.")
+    args = parser.parse_args(argv)
+
+    result = run_load_test(args.requests, args.distinct, args.concurrency, args.latency, args.quota, args.timeout, args.max_queue)
+    for key, value in result.items():
+        print(f"{key:<14} {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
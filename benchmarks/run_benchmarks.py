@@ -0,0 +1,178 @@
+"""
+Benchmarks for the analytics, pre-processing and RAG hot paths on synthetic bookings.
+
+Run from the repo root:
+    python -m benchmarks.run_benchmarks --rows 10000 100000
+    python -m benchmarks.run_benchmarks --rows 10000 --update-baseline   # store the results as the new baseline
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import time
+import tracemalloc
+import warnings
+warnings.filterwarnings("ignore")
+
+import matplotlib
+matplotlib.use("Agg") # no display needed for the plots
+
+from benchmarks.synthetic_data import generate_bookings
+from benchmarks.stand_ins import StubEmbedder, LocalVectorStore
+from src.pre_processing.pre_process import pre_process_data
+from src.pre_processing.feature_engineeing import build_features_for_rag
+from src.pre_processing.data_transformation import dataframe_to_text, build_corpus, corpus_to_vectors
+from src.analytics.get_analytics import build_analytics
+from src.qna_with_data.keyword_index import build_keyword_index
+from src.qna_with_data.metadata_index import build_metadata_index
+from src.qna_with_data.rag_engine import RAGEngine
+from src.qna_with_data.llm_dispatcher import LLMDispatcher, StubBackend
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+SAMPLE_QUERIES = [
+    "What was the overall cancellation rate?",
+    "which country has more than 200 cancellations?",
+    "What was the average stay duration?",
+    "What was the total revenue for the month of May in 2017?",
+    "whats the average waiting list days for the year 2016 for the month of May?",
+    "Resort Hotel bookings from AGO that were canceled",
+]
+
+
+def measure(func, repeat: int = 3, track_memory: bool = True):
+    """
+    Time the function (best of `repeat` runs) and measure its peak traced memory in a separate run,
+    since tracing allocations slows the code down.
+
+    Returns:
+        tuple: ({'seconds', 'peak_mb'}, result of the last run)
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    stats = {"seconds": min(times), "peak_mb": None}
+    if track_memory:
+        tracemalloc.start()
+        try:
+            func()
+            stats["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    return stats, result
+
+
+def run_benchmarks(rows: int, repeat: int = 3, track_memory: bool = True, max_corpus: int = 100_000, seed: int = 0) -> dict:
+    """
+    Run every benchmark on `rows` synthetic bookings.
+
+    Returns:
+        dict: benchmark name -> {'seconds', 'peak_mb'}, names are suffixed with the number of rows.
+    """
+    results = {}
+    def bench(name, func, repeat=repeat):
+        stats, result = measure(func, repeat, track_memory)
+        results[f"{name}[{rows}]"] = stats
+        print(f"  {name:<24} {stats['seconds']:>10.4f} s" + (f" {stats['peak_mb']:>10.1f} MB" if stats['peak_mb'] is not None else ""))
+        return result
+
+    print(f"Benchmarks on {rows} rows")
+    raw = generate_bookings(rows, seed=seed)
+    data = bench("pre_process_data", lambda: pre_process_data(raw))
+    features, global_metrics = bench("build_features_for_rag", lambda: build_features_for_rag(data))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        text_df, global_metrics_df = bench("dataframe_to_text", lambda: dataframe_to_text(features, global_metrics, tmp_dir))
+    bench("build_analytics", lambda: build_analytics(data))
+
+    # Retrieval against local stand-ins, on a corpus capped to keep the in-memory vector store reasonable
+    corpus = build_corpus(text_df.head(max_corpus), global_metrics_df)
+    embedder = StubEmbedder()
+    vector_store = LocalVectorStore(corpus_to_vectors(corpus, embedder.encode(corpus['text_data'].tolist())))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        keyword_index_path = os.path.join(tmp_dir, "keyword_index.npz")
+        metadata_index_path = os.path.join(tmp_dir, "metadata_index.npz")
+        bench("build_keyword_index", lambda: build_keyword_index(corpus, keyword_index_path), repeat=1)
+        build_metadata_index(corpus, metadata_index_path)
+        engine = RAGEngine(
+            keyword_index_path=keyword_index_path, metadata_index_path=metadata_index_path,
+            embedder=embedder, vector_index=vector_store, query_cache_size=0,
+            llm_dispatcher=LLMDispatcher(StubBackend(latency=0), requests_per_minute=None, tokens_per_minute=None)
+        )
+
+    def ask_all():
+        for query in SAMPLE_QUERIES:
+            context, _ = engine.build_context(query, 2)
+            engine.generate_response(query, context)
+    bench("rag_queries", ask_all)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compare the results against the baseline.
+
+    Returns:
+        list: Descriptions of the benchmarks slower (or using more memory) than the baseline by more than `tolerance`.
+    """
+    regressions = []
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        for metric in ("seconds", "peak_mb"):
+            current, reference = stats.get(metric), baseline[name].get(metric)
+            if current is None or not reference:
+                continue
+            if current > reference * (1 + tolerance):
+                regressions.append(f"{name} {metric}: {current:.4f} vs baseline {reference:.4f} (+{(current / reference - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000], help="Synthetic dataset sizes (10k to 10M rows).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark, the best one is kept.")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the peak memory measurement runs.")
+    parser.add_argument("--max-corpus", type=int, default=100_000, help="Maximum booking documents indexed for the retrieval benchmark.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results file.")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results in the baseline file.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown / memory growth over the baseline (0.2 = 20%%).")
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for rows in args.rows:
+        results.update(run_benchmarks(rows, args.repeat, not args.no_memory, args.max_corpus))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if not baseline:
+        print("No baseline to compare against, run with --update-baseline to create one.")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print("No regressions against the baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from src.qna_with_data.keyword_index import tokenize
+
+
+class StubTokenizer:
+    def tokenize(self, text: str) -> list:
+        return tokenize(text)
+
+
+class StubEmbedder:
+    """
+    Deterministic stand-in for the SentenceTransformer: hashed bag-of-words vectors, no model download.
+    """
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self.tokenizer = StubTokenizer()
+
+
+    def _encode_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for token in tokenize(text):
+            vector[zlib.crc32(token.encode("utf-8")) % self.dimension] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+    def encode(self, texts, **kwargs):
+        if isinstance(texts, str):
+            return self._encode_one(texts)
+        return np.stack([self._encode_one(text) for text in texts]) if len(texts) else np.zeros((0, self.dimension), np.float32)
+
+
+class Match(dict):
+    """
+    A query match, accessed like the Pinecone ScoredVector (match.get('score'), match.metadata).
+    """
+    @property
+    def metadata(self):
+        return self['metadata']
+
+
+class LocalVectorStore:
+    """
+    In-memory stand-in for the Pinecone index: exact cosine search with $eq / $in metadata filters.
+    """
+    def __init__(self, vectors: list):
+        """
+        Args:
+            vectors (list): Vectors in Pinecone upsert format, e.g. from corpus_to_vectors.
+        """
+        self.ids = [v['id'] for v in vectors]
+        self.metadata = [v['metadata'] for v in vectors]
+        self.matrix = np.asarray([v['values'] for v in vectors], dtype=np.float32)
+        self.metadata_df = pd.DataFrame(self.metadata)
+
+
+    def _filter_mask(self, filter: dict) -> np.ndarray:
+        mask = np.ones(len(self.ids), dtype=bool)
+        for attr, condition in filter.items():
+            if attr not in self.metadata_df.columns:
+                return np.zeros(len(self.ids), dtype=bool)
+            column = self.metadata_df[attr]
+            if "$eq" in condition:
+                mask &= (column == condition["$eq"]).to_numpy()
+            if "$in" in condition:
+                mask &= column.isin(condition["$in"]).to_numpy()
+        return mask
+
+
+    def query(self, vector, top_k: int, include_metadata: bool = True, filter: dict = None):
+        scores = self.matrix @ np.asarray(vector, dtype=np.float32)
+        if filter:
+            scores = np.where(self._filter_mask(filter), scores, -np.inf)
+        top = np.argsort(-scores, kind="stable")[:top_k]
+        top = top[np.isfinite(scores[top])]
+        return SimpleNamespace(matches=[
+            Match(id=self.ids[i], score=float(scores[i]), metadata=self.metadata[i] if include_metadata else {})
+            for i in top
+        ])
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+
+HOTELS = ['City Hotel', 'Resort Hotel']
+MEALS = ['BB', 'HB', 'SC', 'Undefined', 'FB']
+COUNTRIES = ['PRT', 'GBR', 'FRA', 'ESP', 'DEU', 'ITA', 'IRL', 'BEL', 'BRA', 'NLD', 'USA', 'CHE', 'CN', 'AUT', 'AGO']
+MARKET_SEGMENTS = ['Online TA', 'Offline TA/TO', 'Groups', 'Direct', 'Corporate', 'Complementary', 'Aviation']
+DISTRIBUTION_CHANNELS = ['TA/TO', 'Direct', 'Corporate', 'GDS']
+ROOM_TYPES = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']
+DEPOSIT_TYPES = ['No Deposit', 'Non Refund', 'Refundable']
+CUSTOMER_TYPES = ['Transient', 'Transient-Party', 'Contract', 'Group']
+AGENTS = [9.0, 240.0, 1.0, 14.0, 7.0, 6.0, 250.0, 241.0, 28.0, 8.0]
+
+
+def generate_bookings(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate synthetic hotel bookings with the schema of the raw hotel_bookings.csv expected by pre_process_data
+    (including the missing values it handles: children, country, agent and company).
+
+    Args:
+        n_rows (int): Number of bookings to generate.
+        seed (int): Random seed, the same seed always gives the same data.
+
+    Returns:
+        pd.DataFrame: The synthetic bookings.
+    """
+    rng = np.random.default_rng(seed)
+
+    # Arrival dates over the period covered by the real dataset
+    start, end = np.datetime64('2015-07-01'), np.datetime64('2017-08-31')
+    arrival = pd.to_datetime(start + rng.integers(0, (end - start).astype(int) + 1, n_rows).astype('timedelta64[D]'))
+    lead_time = rng.gamma(1.0, 100.0, n_rows).astype(int)
+    is_canceled = (rng.random(n_rows) < 0.37).astype(int)
+    weekend_nights = rng.integers(0, 4, n_rows)
+    week_nights = rng.integers(0, 6, n_rows)
+    status_date = np.where(
+        is_canceled == 1,
+        arrival - pd.to_timedelta(rng.integers(0, lead_time + 1), unit='D'),
+        arrival + pd.to_timedelta(weekend_nights + week_nights, unit='D')
+    )
+
+    def with_missing(values, fraction):
+        values = pd.Series(values, dtype=object if isinstance(values[0], str) else float)
+        values[rng.random(n_rows) < fraction] = np.nan
+        return values
+
+    reserved_room = rng.choice(ROOM_TYPES, n_rows)
+    return pd.DataFrame({
+        'hotel': rng.choice(HOTELS, n_rows, p=[0.66, 0.34]),
+        'is_canceled': is_canceled,
+        'lead_time': lead_time,
+        'arrival_date_year': arrival.year,
+        'arrival_date_month': arrival.month_name(),
+        'arrival_date_week_number': arrival.isocalendar().week.to_numpy().astype(int),
+        'arrival_date_day_of_month': arrival.day,
+        'stays_in_weekend_nights': weekend_nights,
+        'stays_in_week_nights': week_nights,
+        'adults': rng.integers(1, 4, n_rows),
+        'children': with_missing(rng.choice([0, 1, 2], n_rows, p=[0.92, 0.05, 0.03]), 0.0001),
+        'babies': rng.choice([0, 1], n_rows, p=[0.99, 0.01]),
+        'meal': rng.choice(MEALS, n_rows),
+        'country': with_missing(rng.choice(COUNTRIES, n_rows), 0.004),
+        'market_segment': rng.choice(MARKET_SEGMENTS, n_rows),
+        'distribution_channel': rng.choice(DISTRIBUTION_CHANNELS, n_rows),
+        'is_repeated_guest': (rng.random(n_rows) < 0.03).astype(int),
+        'previous_cancellations': rng.choice([0, 1, 2], n_rows, p=[0.94, 0.05, 0.01]),
+        'previous_bookings_not_canceled': rng.choice([0, 1, 2], n_rows, p=[0.97, 0.02, 0.01]),
+        'reserved_room_type': reserved_room,
+        'assigned_room_type': np.where(rng.random(n_rows) < 0.87, reserved_room, rng.choice(ROOM_TYPES, n_rows)),
+        'booking_changes': rng.choice([0, 1, 2], n_rows, p=[0.85, 0.11, 0.04]),
+        'deposit_type': rng.choice(DEPOSIT_TYPES, n_rows, p=[0.87, 0.12, 0.01]),
+        'agent': with_missing(rng.choice(AGENTS, n_rows), 0.14),
+        'company': with_missing(rng.integers(1, 500, n_rows).astype(float), 0.94),
+        'days_in_waiting_list': np.where(rng.random(n_rows) < 0.03, rng.integers(1, 100, n_rows), 0),
+        'customer_type': rng.choice(CUSTOMER_TYPES, n_rows, p=[0.75, 0.21, 0.03, 0.01]),
+        'adr': rng.gamma(4.0, 25.0, n_rows).round(2),
+        'required_car_parking_spaces': (rng.random(n_rows) < 0.06).astype(int),
+        'total_of_special_requests': rng.choice([0, 1, 2, 3], n_rows, p=[0.59, 0.28, 0.11, 0.02]),
+        'reservation_status': np.where(is_canceled == 1, 'Canceled', 'Check-Out'),
+        'reservation_status_date': pd.to_datetime(status_date).strftime('%Y-%m-%d'),
+    })
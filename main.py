@@ -1,13 +1,19 @@
-from src.analytics.get_analytics import build_analytics
+from src.analytics.get_analytics import AnalyticsRenderer, IMAGE_FORMATS, PLOTS, resolve_plot_options
 from src.qna_with_data.rag_engine import RAGEngine
+from src.qna_with_data.sql_engine import get_sql_engine
+from src.qna_with_data.llm_dispatcher import LLMDispatcher, GroqBackend, StubBackend, QueueFullError, DeadlineExceededError
+from src.monitoring import metrics
 
 import pandas as pd 
 import os 
 
 import io 
 import base64
+import hashlib
+import time
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, url_for
+from groq import Groq
 
 # Ignore Warnings
 import warnings
@@ -19,23 +25,164 @@ app = Flask(__name__)
 
 # Load DataFrame
 print("🕗 Loading DataFrame...")
-dataframe = pd.read_csv("data/structured/data_for_analytics.csv")
+dataframe_path = "data/structured/data_for_analytics.csv"
+dataframe = pd.read_csv(dataframe_path)
 print("✅ DataFrame loaded!")
 
+# Analytics plots of the dataframe, cached by ETag (dataset version + output options)
+analytics_renderer = AnalyticsRenderer(dataframe)
+
+# LLM dispatcher shared by the RAG and SQL engines (LLM_BACKEND=stub for offline load tests)
+if os.getenv("LLM_BACKEND") == "stub":
+    llm_dispatcher = LLMDispatcher(StubBackend())
+else:
+    llm_dispatcher = LLMDispatcher(GroqBackend(Groq(api_key=os.getenv("GROQ_API_KEY"))))
+# Seconds an /ask request may wait for its LLM completion (queue, rate limits and the call) before it gets a 503
+llm_timeout = float(os.getenv("LLM_TIMEOUT", "20"))
+
 # Load RAG Engine
 print("🕗 Loading RAG Engine...")
-rag_engine = RAGEngine()
+rag_engine = RAGEngine(llm_dispatcher=llm_dispatcher)
 print("✅ RAG client initiated!")
 
 
-@app.route("/analytics", methods=["POST"])
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.endpoint = request.endpoint or "unknown"
+    metrics.REQUESTS_IN_FLIGHT.inc(endpoint=g.endpoint)
+
+
+@app.teardown_request
+def stop_request_timer(exc=None):
+    if "request_start" in g:
+        metrics.REQUESTS_IN_FLIGHT.dec(endpoint=g.endpoint)
+        metrics.REQUEST_DURATION.observe(time.perf_counter() - g.request_start, endpoint=g.endpoint)
+
+
+def profiling_requested(data=None):
+    """
+        Per-request profiling toggle: '?profile=1' or '"profile": true' in the JSON body.
+    """
+    if request.args.get("profile", "").lower() in ("1", "true", "yes"):
+        return True
+    return bool(data and data.get("profile"))
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """
+        API endpoint exposing the latency histograms, cache and in-flight request metrics in Prometheus format.
+    """
+    return metrics.render_metrics(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+def plot_request_options(source) -> tuple:
+    """
+        Plot output options from the query string or the JSON body: 'format' (png, svg, webp), 'dpi',
+        'width' and 'height' (inches, both or neither). They are validated and normalized by the renderer.
+    """
+    width, height = source.get("width"), source.get("height")
+    if (width is None) != (height is None):
+        raise ValueError("Width and height must be given together.")
+    size = (width, height) if width is not None else None
+    return source.get("format", "png"), source.get("dpi"), size
+
+
+def is_flag_set(value, default: bool) -> bool:
+    """
+        Boolean option from the JSON body or the query string ('1', 'true', 'yes').
+    """
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def not_modified(etag: str) -> bool:
+    """
+        Whether the client already has this version (If-None-Match), only for safe methods.
+    """
+    return request.method in ("GET", "HEAD") and request.if_none_match.contains_weak(etag)
+
+
+def conditional_response(response, etag: str):
+    response.set_etag(etag)
+    # Cached copies must be revalidated, which is a cheap 304 as long as the data does not change
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@app.route("/analytics", methods=["GET", "POST"])
 def analytics():
     """
-        API endpoint to generate analytics and return them as Base64-encoded images.
+        API endpoint to generate analytics and return them as Base64-encoded images, or with 'inline' false
+        as the URLs of the individual plots. Output options as in plot_request_options, from the query string
+        (GET) or the JSON body (POST), which can also hold 'plot_options' with per plot overrides.
+        GET requests are conditional: If-None-Match with the current ETag returns 304 without rendering.
     """
+    data = (request.get_json(silent=True) or {}) if request.method == "POST" else request.args
+    try:
+        plot_options = data.get("plot_options") if request.method == "POST" else None
+        options = resolve_plot_options(*plot_request_options(data), plot_options)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid plot options: {e}"}), 400
+    etags = {name: analytics_renderer.etag(name, *plot_options) for name, plot_options in options.items()}
+
+    inline = is_flag_set(data.get("inline"), True)
+    etag = hashlib.sha1(f"{inline}|{'|'.join(etags.values())}".encode("utf-8")).hexdigest()[:20]
+    if not_modified(etag):
+        return conditional_response(app.response_class(status=304), etag)
+
+    if not inline:
+        # Only the plot URLs, each plot is fetched (and revalidated) on its own
+        analytics = {}
+        for name, (plot_format, plot_dpi, plot_size) in options.items():
+            params = {"format": plot_format}
+            if plot_dpi is not None:
+                params["dpi"] = plot_dpi
+            if plot_size is not None:
+                params["width"], params["height"] = plot_size
+            analytics[name] = url_for("analytics_plot", name=name, **params)
+        return conditional_response(jsonify(analytics), etag)
+
     # get analytics from dataframe 
-    analytics = build_analytics(dataframe) 
-    return analytics
+    with metrics.profile(profiling_requested(data if request.method == "POST" else None)) as spans:
+        with metrics.timed("analytics.build_analytics"):
+            analytics = {
+                name: base64.b64encode(image).decode("utf-8")
+                for name, image in analytics_renderer.render_all(options).items()
+            }
+    response = conditional_response(jsonify(analytics), etag)
+    if spans is not None:
+        # The plots are the whole body, so the stage breakdown goes in the Server-Timing header
+        response.headers["Server-Timing"] = metrics.server_timing_header(spans)
+    return response
+
+
+@app.route("/analytics/<name>", methods=["GET"])
+def analytics_plot(name):
+    """
+        API endpoint returning one plot as an image (options as in plot_request_options), with a strong ETag
+        derived from the dataset version and the options: If-None-Match with it returns 304 without rendering.
+    """
+    if name not in PLOTS:
+        return jsonify({"error": f"Unknown plot '{name}'"}), 404
+    try:
+        image_format, dpi, size = plot_request_options(request.args)
+        etag = analytics_renderer.etag(name, image_format, dpi, size)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not_modified(etag):
+        return conditional_response(app.response_class(status=304), etag)
+
+    with metrics.profile(profiling_requested()) as spans:
+        image, etag = analytics_renderer.render(name, image_format, dpi, size)
+    response = conditional_response(app.response_class(image, mimetype=IMAGE_FORMATS[image_format]), etag)
+    if spans is not None:
+        response.headers["Server-Timing"] = metrics.server_timing_header(spans)
+    return response
 
 
 @app.route("/ask", methods=["POST"])
@@ -45,15 +192,36 @@ def ask():
     """
     data = request.get_json()
     query = data.get("query")
+    filters = data.get("filters") # optional metadata filters, e.g. {"hotel": "Resort Hotel", "year": 2016}
+    mode = data.get("mode", "rag") # "rag" or "sql" (aggregate questions answered with SQL over the bookings)
 
     if not query:
         return jsonify({"error": "Query is required"}), 400
-
-    # get response from RAG engine
-    context = rag_engine.query_vector_db(query, 2)
-    response = rag_engine.generate_response(query, context)
-    
-    return jsonify({"response": response})
+    if filters is not None and not isinstance(filters, dict):
+        return jsonify({"error": "Filters must be an object"}), 400
+    if mode not in ("rag", "sql"):
+        return jsonify({"error": "Mode must be 'rag' or 'sql'"}), 400
+
+    with metrics.profile(profiling_requested(data)) as spans:
+        try:
+            if mode == "sql":
+                # get response from the SQL engine (loaded from the dataframe on first use)
+                result = {"response": get_sql_engine(dataframe_path, dataframe, llm_dispatcher=llm_dispatcher).ask(query, llm_timeout)}
+            else:
+                # get response from RAG engine
+                context, context_stats = rag_engine.build_context(query, 2, filters)
+                response = rag_engine.generate_response(query, context, timeout=llm_timeout)
+                result = {"response": response, "context_stats": context_stats}
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except (QueueFullError, DeadlineExceededError) as e:
+            # LLM capacity exhausted, the client should retry later
+            return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+
+    if spans is None:
+        return jsonify(result)
+    result["profile"] = metrics.format_profile(spans)
+    return jsonify(result), 200, {"Server-Timing": metrics.server_timing_header(spans)}
 
 
 if __name__ == "__main__":
@@ -1,28 +1,57 @@
 import io 
 import base64 
+import hashlib
+import threading
+from collections import OrderedDict
 import matplotlib.pyplot as plt
 import seaborn as sns 
 import pandas as pd
 from flask import Flask, request, jsonify
 
+from src.monitoring.metrics import timed, record_cache
 
-def build_analytics(dataframe: pd.DataFrame): 
+
+# Output formats and their content types
+IMAGE_FORMATS = {"png": "image/png", "svg": "image/svg+xml", "webp": "image/webp"}
+
+# Encoder settings: optimized (still lossless) PNG, lossy WebP (flat plot colors compress well), SVG without timestamp
+SAVE_KWARGS = {
+    "png": {"pil_kwargs": {"optimize": True}},
+    "webp": {"pil_kwargs": {"quality": 80, "method": 6}},
+    "svg": {"metadata": {"Date": None}},
+}
+
+
+def prepare_dataframe(dataframe: pd.DataFrame) -> pd.DataFrame:
     """
-    Generate analytics plots from the given dataframe and return them as Base64 encoded strings.
+    Add the columns used by the plots. Done once per dataset, not once per plot.
 
     Args:
         dataframe (pd.DataFrame): The input dataframe containing the hotel booking data.
 
     Returns:
-        dict: A dictionary containing the Base64 encoded strings of the generated plots.
+        pd.DataFrame: A copy of the dataframe with the plot columns added.
     """
     df = dataframe.copy()
-
-    ## Revenue Trends 
     df['reservation_status_date'] = pd.to_datetime(df['reservation_status_date'])
     # Calculate Revenue per booking 
     df['total_nights'] = df['stays_in_weekend_nights'] + df['stays_in_week_nights']
     df['revenue'] = df['adr'] * df['total_nights']
+    return df
+
+
+def dataset_version(dataframe: pd.DataFrame) -> str:
+    """
+    Content hash of the dataframe, changes whenever the data does.
+    """
+    row_hashes = pd.util.hash_pandas_object(dataframe, index=True).values
+    return hashlib.sha1(row_hashes.tobytes() + "|".join(map(str, dataframe.columns)).encode("utf-8")).hexdigest()[:16]
+
+
+def _plot_revenue_trends(df: pd.DataFrame):
+    """
+    Revenue Trends
+    """
     revenue_trend = df.groupby(df['reservation_status_date'].dt.to_period('M'))['revenue'].sum()
     # Plot
     plt.figure(figsize=(12, 6))
@@ -32,60 +61,48 @@ def build_analytics(dataframe: pd.DataFrame):
     plt.ylabel('Total Revenue')
     plt.grid(True)
     plt.xticks(rotation=45)
-    # Save plot to memory buffer
-    img_buf = io.BytesIO()
-    plt.savefig(img_buf, format="png")
-    plt.close()
-    img_buf.seek(0)
-    # Encode image to Base64
-    plot1 = base64.b64encode(img_buf.read()).decode("utf-8")
 
-    ## Arrival Distribution by day of the week 
+
+def _plot_arrival_distribution(df: pd.DataFrame):
+    """
+    Arrival Distribution by day of the week
+    """
     plt.figure(figsize=(10, 5))
     sns.countplot(x=df['arrival_day_of_week'], order=['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'], palette='viridis')
     plt.title('Arrival Distribution by Day of the Week')
     plt.xlabel('Day of the Week')
     plt.ylabel('Number of Arrivals')
     plt.xticks(rotation=45)
-    # Save plot to memory buffer
-    img_buf = io.BytesIO()
-    plt.savefig(img_buf, format="png")
-    plt.close()
-    img_buf.seek(0)
-    # Encode image to Base64
-    plot2 = base64.b64encode(img_buf.read()).decode("utf-8")
 
-    ## Weekend vs Weekday Arrivals 
+
+def _plot_weekend_vs_weekday(df: pd.DataFrame):
+    """
+    Weekend vs Weekday Arrivals
+    """
     plt.figure(figsize=(6, 4))
     sns.countplot(x=df['is_weekend_arrival'], palette='coolwarm')
     plt.xticks([0, 1], ['Weekday', 'Weekend'])
     plt.title('Weekend vs. Weekday Arrivals')
     plt.xlabel('Arrival Type')
     plt.ylabel('Number of Arrivals')
-    # Save plot to memory buffer
-    img_buf = io.BytesIO()
-    plt.savefig(img_buf, format="png")
-    plt.close()
-    img_buf.seek(0)
-    # Encode image to Base64
-    plot3 = base64.b64encode(img_buf.read()).decode("utf-8")
 
-    ## Holiday vs Non-Holiday Season 
+
+def _plot_holiday_vs_non_holiday(df: pd.DataFrame):
+    """
+    Holiday vs Non-Holiday Season
+    """
     plt.figure(figsize=(6, 4))
     sns.countplot(x=df['is_holiday_season'], palette='coolwarm')
     plt.xticks([0, 1], ['Non-Holiday', 'Holiday'])
     plt.title('Holiday Season vs. Non-Holiday Arrivals')
     plt.xlabel('Season Type')
     plt.ylabel('Number of Arrivals')
-    # Save plot to memory buffer
-    img_buf = io.BytesIO()
-    plt.savefig(img_buf, format="png")
-    plt.close()
-    img_buf.seek(0)
-    # Encode image to Base64
-    plot4 = base64.b64encode(img_buf.read()).decode("utf-8")
 
-    ## Cancellation rate as percentage of total bookings 
+
+def _plot_cancellation_rate(df: pd.DataFrame):
+    """
+    Cancellation rate as percentage of total bookings
+    """
     total_bookings = len(df)
     canceled_bookings = df['is_canceled'].sum()
     cancellation_rate = (canceled_bookings / total_bookings) * 100
@@ -100,15 +117,12 @@ def build_analytics(dataframe: pd.DataFrame):
     plt.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
     # Title
     plt.title("Booking Cancellation Rate")
-    # Save plot to memory buffer
-    img_buf = io.BytesIO()
-    plt.savefig(img_buf, format="png")
-    plt.close()
-    img_buf.seek(0)
-    # Encode image to Base64
-    plot5 = base64.b64encode(img_buf.read()).decode("utf-8")
 
-    ## Geographical Distribution of Bookings
+
+def _plot_geographical_distribution(df: pd.DataFrame):
+    """
+    Geographical Distribution of Bookings
+    """
     # Count of bookings per country
     country_bookings = df['country'].value_counts().head(10)  
     plt.figure(figsize=(12, 5))
@@ -117,74 +131,59 @@ def build_analytics(dataframe: pd.DataFrame):
     plt.xlabel('Country')
     plt.ylabel('Number of Bookings')
     plt.xticks(rotation=45)
-    # Save plot to memory buffer
-    img_buf = io.BytesIO()
-    plt.savefig(img_buf, format="png")
-    plt.close()
-    img_buf.seek(0)
-    # Encode image to Base64
-    plot6 = base64.b64encode(img_buf.read()).decode("utf-8")
 
-    ## Booking lead time distribution
+
+def _plot_booking_lead_time(df: pd.DataFrame):
+    """
+    Booking lead time distribution
+    """
     plt.figure(figsize=(12, 5))
     sns.histplot(df['lead_time'], bins=50, kde=True, color='purple')
     plt.title('Distribution of Booking Lead Time')
     plt.xlabel('Lead Time (Days)')
     plt.ylabel('Number of Bookings')
     plt.grid(True)
-    # Save plot to memory buffer
-    img_buf = io.BytesIO()
-    plt.savefig(img_buf, format="png")
-    plt.close()
-    img_buf.seek(0)
-    # Encode image to Base64
-    plot7 = base64.b64encode(img_buf.read()).decode("utf-8")
 
-    ## Revenue by Distribution Channel
+
+def _plot_revenue_by_channel(df: pd.DataFrame):
+    """
+    Revenue by Distribution Channel
+    """
     channel_revenue = df.groupby('distribution_channel')['revenue'].sum().sort_values(ascending=False)
     plt.figure(figsize=(10, 5))
     sns.barplot(x=channel_revenue.index, y=channel_revenue.values, palette='Blues_r')
     plt.title('Revenue by Distribution Channel')
     plt.xlabel('Distribution Channel')
     plt.ylabel('Total Revenue')
-    # save plot to memory buffer
-    img_buf = io.BytesIO()
-    plt.savefig(img_buf, format="png")
-    plt.close()
-    img_buf.seek(0)
-    # Encode image to Base64
-    plot8 = base64.b64encode(img_buf.read()).decode("utf-8")
 
-    ## Count of Reserved room types 
+
+def _plot_room_type_distribution(df: pd.DataFrame):
+    """
+    Count of Reserved room types
+    """
     room_counts = df['reserved_room_type'].value_counts()
     plt.figure(figsize=(10, 5))
     sns.barplot(x=room_counts.index, y=room_counts.values, palette='magma')
     plt.title('Most Popular Reserved Room Types')
     plt.xlabel('Room Type')
     plt.ylabel('Number of Bookings')
-    # Save plot to memory buffer
-    img_buf = io.BytesIO()
-    plt.savefig(img_buf, format="png")
-    plt.close()
-    img_buf.seek(0)
-    # Encode image to Base64
-    plot9 = base64.b64encode(img_buf.read()).decode("utf-8")
 
-    ## Special Requests vs Cancellation 
+
+def _plot_special_requests_vs_cancellation(df: pd.DataFrame):
+    """
+    Special Requests vs Cancellation
+    """
     plt.figure(figsize=(10, 5))
     sns.boxplot(x=df['is_canceled'], y=df['total_of_special_requests'], palette='coolwarm')
     plt.title('Special Requests vs Cancellation')
     plt.xlabel('Is Canceled')
     plt.ylabel('Total Special Requests')
-    # Save plot to memory buffer
-    img_buf = io.BytesIO()
-    plt.savefig(img_buf, format="png")
-    plt.close()
-    img_buf.seek(0)
-    # Encode image to Base64
-    plot10 = base64.b64encode(img_buf.read()).decode("utf-8")
 
-    ## Booking trends by month 
+
+def _plot_booking_trends_by_month(df: pd.DataFrame):
+    """
+    Booking trends by month
+    """
     plt.figure(figsize=(12, 5))
     sns.countplot(x=df['month'], order=[
         'January', 'February', 'March', 'April', 'May', 'June', 'July', 
@@ -195,15 +194,12 @@ def build_analytics(dataframe: pd.DataFrame):
     plt.ylabel('Number of Bookings')
     plt.xticks(rotation=45)
     plt.grid(axis='y', linestyle='--', alpha=0.7)
-    # save plot to memory buffer 
-    img_buf = io.BytesIO()
-    plt.savefig(img_buf, format="png")
-    plt.close()
-    img_buf.seek(0)
-    # Encode image to Base64
-    plot11 = base64.b64encode(img_buf.read()).decode("utf-8")
 
-    ## Cancellation Rate vs Lead time 
+
+def _plot_cancellation_rate_vs_lead_time(df: pd.DataFrame):
+    """
+    Cancellation Rate vs Lead time
+    """
     plt.figure(figsize=(12, 5))
     sns.boxplot(x=df['is_canceled'], y=df['lead_time'], palette='coolwarm')
 
@@ -211,30 +207,24 @@ def build_analytics(dataframe: pd.DataFrame):
     plt.xlabel('Canceled (1 = Yes, 0 = No)')
     plt.ylabel('Lead Time (Days)')
     plt.grid(True)
-    # Save plot to memory buffer
-    img_buf = io.BytesIO()
-    plt.savefig(img_buf, format="png")
-    plt.close()
-    img_buf.seek(0)
-    # Encode image to Base64
-    plot12 = base64.b64encode(img_buf.read()).decode("utf-8")
 
-    ## Market Segment-wise Booking Distribution 
+
+def _plot_market_segment_distribution(df: pd.DataFrame):
+    """
+    Market Segment-wise Booking Distribution
+    """
     plt.figure(figsize=(12, 5))
     sns.countplot(y=df['market_segment'], order=df['market_segment'].value_counts().index, palette='Set2')
     plt.title('Market Segment-wise Booking Distribution')
     plt.xlabel('Number of Bookings')
     plt.ylabel('Market Segment')
     plt.grid(axis='x', linestyle='--', alpha=0.7)
-    # Save plot to memory buffer
-    img_buf = io.BytesIO()
-    plt.savefig(img_buf, format="png")
-    plt.close()
-    img_buf.seek(0)
-    # Encode image to Base64
-    plot13 = base64.b64encode(img_buf.read()).decode("utf-8")
 
-    ## Cancelation Rate by Market Segment
+
+def _plot_cancellation_rate_by_segment(df: pd.DataFrame):
+    """
+    Cancelation Rate by Market Segment
+    """
     segment_cancellation = df.groupby('market_segment')['is_canceled'].mean() * 100
     plt.figure(figsize=(10, 5))
     sns.barplot(x=segment_cancellation.index, y=segment_cancellation.values, palette='Reds_r')
@@ -243,15 +233,12 @@ def build_analytics(dataframe: pd.DataFrame):
     plt.ylabel('Cancellation Rate (%)')
     plt.xticks(rotation=45)
     plt.grid(axis='y', linestyle='--', alpha=0.7)
-    # Save plot to memory buffer
-    img_buf = io.BytesIO()
-    plt.savefig(img_buf, format="png")
-    plt.close()
-    img_buf.seek(0)
-    # Encode image to Base64
-    plot14 = base64.b64encode(img_buf.read()).decode("utf-8")
 
-    ## Booking cancellation by Customer type 
+
+def _plot_cancellation_by_customer_type(df: pd.DataFrame):
+    """
+    Booking cancellation by Customer type
+    """
     plt.figure(figsize=(10, 5))
     sns.countplot(x=df['customer_type'], hue=df['is_canceled'], palette='Set1')
     plt.title('Booking Cancellation by Customer Type')
@@ -259,32 +246,206 @@ def build_analytics(dataframe: pd.DataFrame):
     plt.ylabel('Number of Bookings')
     plt.legend(title="Canceled", labels=["No", "Yes"])
     plt.grid(axis='y', linestyle='--', alpha=0.7)
-    # Save plot to memory buffer
-    img_buf = io.BytesIO()
-    plt.savefig(img_buf, format="png")
-    plt.close()
-    img_buf.seek(0)
+
+
+# Plot name -> function drawing it on a new figure, in the order of the analytics payload
+PLOTS = {
+    "revenue_trends": _plot_revenue_trends,
+    "arrival_distribution": _plot_arrival_distribution,
+    "weekend_vs_weekday": _plot_weekend_vs_weekday,
+    "holiday_vs_non_holiday": _plot_holiday_vs_non_holiday,
+    "cancellation_rate": _plot_cancellation_rate,
+    "geographical_distribution": _plot_geographical_distribution,
+    "booking_lead_time": _plot_booking_lead_time,
+    "revenue_by_channel": _plot_revenue_by_channel,
+    "room_type_distribution": _plot_room_type_distribution,
+    "special_requests_vs_cancellation": _plot_special_requests_vs_cancellation,
+    "booking_trends_by_month": _plot_booking_trends_by_month,
+    "cancellation_rate_vs_lead_time": _plot_cancellation_rate_vs_lead_time,
+    "market_segment_distribution": _plot_market_segment_distribution,
+    "cancellation_rate_by_segment": _plot_cancellation_rate_by_segment,
+    "cancellation_by_customer_type": _plot_cancellation_by_customer_type,
+}
+
+
+def normalize_plot_options(name: str, image_format: str = "png", dpi: float = None, size: tuple = None) -> tuple:
+    """
+    Check the plot name and output options and normalize them, so that equal options give equal cache keys
+    (e.g. dpi 100 and '100.0', size [8, 4] and ('8', '4')).
+
+    Returns:
+        tuple: The (image_format, dpi, size) with dpi a float and size a tuple of floats, or None.
+
+    Raises:
+        ValueError: If the plot or an option is invalid.
+    """
+    if name not in PLOTS:
+        raise ValueError(f"Unknown plot '{name}'.")
+    if not isinstance(image_format, str) or image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format '{image_format}', use one of {', '.join(IMAGE_FORMATS)}.")
+    # A string is iterable too: "12" must not become (1.0, 2.0)
+    if size is not None and not (isinstance(size, (list, tuple)) and len(size) == 2):
+        raise ValueError("Size must be (width, height) in inches, between 1 and 40.")
+    try:
+        dpi = float(dpi) if dpi is not None else None
+        size = tuple(float(s) for s in size) if size is not None else None
+    except (TypeError, ValueError):
+        raise ValueError("DPI and size must be numbers.")
+    if dpi is not None and not 10 <= dpi <= 600:
+        raise ValueError("DPI must be between 10 and 600.")
+    if size is not None and not all(1 <= s <= 40 for s in size):
+        raise ValueError("Size must be (width, height) in inches, between 1 and 40.")
+    return image_format, dpi, size
+
+
+def resolve_plot_options(image_format: str = "png", dpi: float = None, size: tuple = None, plot_options: dict = None) -> dict:
+    """
+    Output options of every plot: the defaults with the per plot overrides applied, normalized.
+
+    Args:
+        image_format (str): Default image format.
+        dpi (float): Default DPI.
+        size (tuple): Default figure (width, height) in inches.
+        plot_options (dict): Per plot overrides, plot name -> {"format", "dpi", "size"}.
+
+    Returns:
+        dict: Plot name -> (image_format, dpi, size), in the order of PLOTS.
+
+    Raises:
+        ValueError: If a plot or an option is invalid.
+    """
+    plot_options = plot_options or {}
+    if not isinstance(plot_options, dict) or not all(isinstance(o, dict) for o in plot_options.values()):
+        raise ValueError("Plot options must map plot names to objects.")
+    unknown = [name for name in plot_options if name not in PLOTS]
+    if unknown:
+        raise ValueError(f"Unknown plots {unknown}.")
+    options = {}
+    for name in PLOTS:
+        overrides = plot_options.get(name, {})
+        options[name] = normalize_plot_options(
+            name, overrides.get("format", image_format), overrides.get("dpi", dpi), overrides.get("size", size)
+        )
+    return options
+
+
+def render_plot(df: pd.DataFrame, name: str, image_format: str = "png", dpi: float = None, size: tuple = None) -> bytes:
+    """
+    Render one plot.
+
+    Args:
+        df (pd.DataFrame): The dataframe returned by prepare_dataframe.
+        name (str): The plot name (a key of PLOTS).
+        image_format (str): 'png', 'svg' or 'webp'.
+        dpi (float): Output resolution, defaults to the figure DPI.
+        size (tuple): Figure (width, height) in inches, defaults to the plot's own size.
+
+    Returns:
+        bytes: The encoded image.
+    """
+    image_format, dpi, size = normalize_plot_options(name, image_format, dpi, size)
+    with timed(f"analytics.plot.{name}"):
+        PLOTS[name](df)
+        if size is not None:
+            plt.gcf().set_size_inches(size)
+        # Save plot to memory buffer. A fixed salt for the SVG element ids (random by default) keeps the bytes
+        # identical across renders, as the strong ETags promise
+        img_buf = io.BytesIO()
+        with plt.rc_context({"svg.hashsalt": f"analytics.{name}"}):
+            plt.savefig(img_buf, format=image_format, dpi=dpi or "figure", **SAVE_KWARGS[image_format])
+        plt.close()
+    return img_buf.getvalue()
+
+
+def render_analytics(df: pd.DataFrame, options: dict) -> dict:
+    """
+    Render all the plots.
+
+    Args:
+        df (pd.DataFrame): The dataframe returned by prepare_dataframe.
+        options (dict): Plot name -> (image_format, dpi, size), as returned by resolve_plot_options.
+
+    Returns:
+        dict: Plot name -> encoded image bytes.
+    """
+    return {name: render_plot(df, name, *plot_options) for name, plot_options in options.items()}
+
+
+@timed("analytics.build_analytics")
+def build_analytics(dataframe: pd.DataFrame, image_format: str = "png", dpi: float = None, size: tuple = None,
+    plot_options: dict = None
+): 
+    """
+    Generate analytics plots from the given dataframe and return them as Base64 encoded strings.
+
+    Args:
+        dataframe (pd.DataFrame): The input dataframe containing the hotel booking data.
+        image_format (str): 'png', 'svg' or 'webp'.
+        dpi (float): Output resolution, defaults to the figure DPI.
+        size (tuple): Figure (width, height) in inches, defaults to the plot's own size.
+        plot_options (dict): Per plot overrides, plot name -> {"format", "dpi", "size"}.
+
+    Returns:
+        dict: A dictionary containing the Base64 encoded strings of the generated plots.
+    """
+    options = resolve_plot_options(image_format, dpi, size, plot_options)
+    plots = render_analytics(prepare_dataframe(dataframe), options)
     # Encode image to Base64
-    plot15 = base64.b64encode(img_buf.read()).decode("utf-8")
-
-    
-    return {
-        "revenue_trends": plot1,
-        "arrival_distribution": plot2,
-        "weekend_vs_weekday": plot3,
-        "holiday_vs_non_holiday": plot4,
-        "cancellation_rate": plot5,
-        "geographical_distribution": plot6,
-        "booking_lead_time": plot7,
-        "revenue_by_channel": plot8,
-        "room_type_distribution": plot9,
-        "special_requests_vs_cancellation": plot10,
-        "booking_trends_by_month": plot11,
-        "cancellation_rate_vs_lead_time": plot12,
-        "market_segment_distribution": plot13,
-        "cancellation_rate_by_segment": plot14,
-        "cancellation_by_customer_type": plot15
-    }
-        
+    return {name: base64.b64encode(data).decode("utf-8") for name, data in plots.items()}
+
+
+class AnalyticsRenderer:
+    """
+    Serves the plots of one dataset. The plot columns are prepared once, and the encoded images are cached by ETag,
+    which is derived from the dataset version and the output options, so it only changes when one of them does.
+    """
+    def __init__(self, dataframe: pd.DataFrame, cache_size: int = 128):
+        self.df = prepare_dataframe(dataframe)
+        self.version = dataset_version(dataframe)
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.lock = threading.Lock() # pyplot keeps global state, render one plot at a time
+
+
+    def etag(self, name: str, image_format: str = "png", dpi: float = None, size: tuple = None) -> str:
+        """
+        Strong ETag of a plot (without quotes), known without rendering it.
+        """
+        image_format, dpi, size = normalize_plot_options(name, image_format, dpi, size)
+        key = f"{self.version}|{name}|{image_format}|{dpi}|{size}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+    def render(self, name: str, image_format: str = "png", dpi: float = None, size: tuple = None) -> tuple:
+        """
+        Render a plot, or return it from the cache.
+
+        Returns:
+            tuple: The encoded image bytes and its ETag.
+        """
+        image_format, dpi, size = normalize_plot_options(name, image_format, dpi, size)
+        etag = self.etag(name, image_format, dpi, size)
+        with self.lock:
+            data = self.cache.get(etag)
+            record_cache("analytics_plot", data is not None)
+            if data is None:
+                data = render_plot(self.df, name, image_format, dpi, size)
+                self.cache[etag] = data
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            else:
+                self.cache.move_to_end(etag)
+        return data, etag
+
+
+    def render_all(self, options: dict) -> dict:
+        """
+        Render (or get from the cache) every plot.
 
+        Args:
+            options (dict): Plot name -> (image_format, dpi, size), as returned by resolve_plot_options.
 
+        Returns:
+            dict: Plot name -> encoded image bytes.
+        """
+        return {name: self.render(name, *plot_options)[0] for name, plot_options in options.items()}
@@ -0,0 +1,189 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+
+# Latency buckets in seconds, from sub-millisecond index lookups to multi-second LLM completions
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric:
+    """
+    Base class of the metrics: one series per label set, rendered in the Prometheus text exposition format.
+    """
+    kind = None
+
+    def __init__(self, name: str, description: str, label_names: tuple = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.series = {}
+        self.lock = threading.Lock()
+
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Metric '{self.name}' expects labels {self.label_names}, got {tuple(labels)}.")
+        return tuple((name, labels[name]) for name in self.label_names)
+
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, value in sorted(self.series.items()):
+                lines.extend(self._render_series(key, value))
+        return lines
+
+
+    def _render_series(self, key: tuple, value) -> list:
+        return [f"{self.name}{_format_labels(key)} {value}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            bucket_counts, total, count = self.series.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    bucket_counts[i] += 1
+            self.series[key] = (bucket_counts, total + value, count + 1)
+
+
+    def _render_series(self, key: tuple, value) -> list:
+        bucket_counts, total, count = value
+        lines = [
+            f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {bucket_count}"
+            for bound, bucket_count in zip(self.buckets, bucket_counts)
+        ]
+        lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+### ---- Application metrics ---- ###
+STAGE_DURATION = Histogram(
+    "stage_duration_seconds", "Duration of the pipeline stages (retrieval, LLM completion, plots, pre-processing).", ("stage",)
+)
+REQUEST_DURATION = Histogram("http_request_duration_seconds", "Duration of the HTTP requests.", ("endpoint",))
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served.", ("endpoint",))
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by cache and result (hit / miss).", ("cache", "result"))
+
+REGISTRY = [STAGE_DURATION, REQUEST_DURATION, REQUESTS_IN_FLIGHT, CACHE_REQUESTS]
+
+
+def render_metrics() -> str:
+    """
+    Render all the registered metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def record_cache(cache: str, hit: bool):
+    """
+    Count a cache lookup, the hit rate is cache_requests_total{result="hit"} / cache_requests_total.
+    """
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+### ---- Timing spans and per-request profiling ---- ###
+# Spans of the request being profiled, None when profiling is off
+_profile_spans = contextvars.ContextVar("profile_spans", default=None)
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Time the enclosed block: observed in stage_duration_seconds and added to the active profile, if any.
+    Also usable as a decorator.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - start)
+
+
+def record_span(stage: str, seconds: float):
+    """
+    Record an already measured stage duration.
+    """
+    STAGE_DURATION.observe(seconds, stage=stage)
+    spans = _profile_spans.get()
+    if spans is not None:
+        spans.append((stage, seconds))
+
+
+@contextmanager
+def profile(enabled: bool = True):
+    """
+    Collect the spans recorded in the enclosed block (including in threads started with
+    contextvars.copy_context()). Yields the list of (stage, seconds) tuples, or None when disabled.
+    """
+    if not enabled:
+        yield None
+        return
+    spans = []
+    token = _profile_spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _profile_spans.reset(token)
+
+
+def format_profile(spans: list) -> list:
+    """
+    Format profile spans for a JSON response.
+    """
+    return [{"stage": stage, "ms": round(seconds * 1000, 3)} for stage, seconds in spans]
+
+
+def server_timing_header(spans: list) -> str:
+    """
+    Format profile spans as a Server-Timing header value (shown by the browser dev tools).
+    """
+    return ", ".join(f"{stage.replace(' ', '_')};dur={seconds * 1000:.3f}" for stage, seconds in spans)
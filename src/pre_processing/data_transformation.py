@@ -1,7 +1,15 @@
 import pandas as pd 
 import numpy as np 
 import calendar
+import re
 
+from src.monitoring.metrics import timed
+
+
+# Structured attributes attached to every corpus document (vector metadata and local metadata index)
+METADATA_COLUMNS = ['doc_type', 'hotel', 'year', 'month', 'country', 'market_segment', 'is_canceled']
+# Attributes of the global metrics broken down by them (e.g. revenue per year and month), kept as their metadata
+GLOBAL_METRIC_ATTRIBUTES = ['hotel', 'year', 'month', 'country', 'market_segment']
 
 def row_to_text(row):
     return (
@@ -25,6 +33,71 @@ def row_to_text(row):
     )
 
 
+# Parses the sentences produced by row_to_text back into fields, so passages can be rendered compactly in prompts
+BOOKING_TEXT_PATTERN = re.compile(
+    r"A guest booked a (?P<hotel>.+?) with (?P<adults>\S+) adults, (?P<children>\S+) children, and (?P<babies>\S+) babies\. "
+    r"The booking was made through (?P<market_segment>.+?) via (?P<distribution_channel>.+?) from (?P<country>.+?)\. "
+    r"The lead time was (?P<lead_time>\S+) days \(categorized as (?P<lead_time_bins>.+?)\), and the arrival date was (?P<arrival_date>.+?) "
+    r"\(Year: \S+, Month: \S+, Day: \S+, Week (?P<week>\S+)\)\. "
+    r"The guest stayed (?P<week_nights>\S+) nights on weekdays and (?P<weekend_nights>\S+) nights on weekends\. "
+    r"The reserved room type was (?P<reserved_room_type>.+?), and the assigned room type was (?P<assigned_room_type>.+?)\. "
+    r"The booking had (?P<booking_changes>\S+) changes, with (?P<previous_cancellations>\S+) previous cancellations and "
+    r"(?P<previous_bookings>\S+) successful bookings before\. "
+    r"The deposit type was (?P<deposit_type>.+?), and the booking was handled by agent (?P<agent>.+?)\. "
+    r"The total revenue generated was (?P<total_revenue>\S+) with an ADR \(Average Daily Rate\) of (?P<adr>\S+)\. "
+    r"The reservation status was (?P<status>.+?) on (?P<status_date>.+?)\. "
+    r"The guest had (?P<special_requests>\S+) special requests and required (?P<parking>\S+) parking spaces\. "
+    r"The customer type was (?P<customer_type>.+?), and they spent an average of \S+ days per stay\. "
+    r"The booking was (?P<canceled>canceled|not canceled)\. "
+    r"They were (?P<repeated>a repeated guest|a first-time guest)\. "
+    r"The arrival was (?P<weekend>on a weekend|on a weekday), and it was (?P<holiday>during|not during) a holiday season\. "
+    r"The guest waited (?P<waiting>\S+) days on the waiting list \(Total: \S+ days\)\."
+)
+
+
+def compact_text(text: str) -> str:
+    """
+    Render a corpus document compactly for LLM prompts. Booking sentences (row_to_text) become 'key=value' pairs,
+    dropping the template words and the redundant fields (year/month/day, average stay, waiting list total);
+    any other text only gets its whitespace normalized.
+    """
+    text = " ".join(str(text).split())
+    match = BOOKING_TEXT_PATTERN.fullmatch(text)
+    if match is None:
+        return text
+    f = match.groupdict()
+    date = lambda value: value[:-len(" 00:00:00")] if value.endswith(" 00:00:00") else value
+    yes_no = lambda flag: "yes" if flag else "no"
+    return "; ".join([
+        f"hotel={f['hotel']}",
+        f"guests={f['adults']}A/{f['children']}C/{f['babies']}B",
+        f"segment={f['market_segment']}",
+        f"channel={f['distribution_channel']}",
+        f"country={f['country']}",
+        f"lead_time={f['lead_time']}d ({f['lead_time_bins']})",
+        f"arrival={date(f['arrival_date'])} wk{f['week']}",
+        f"nights={f['week_nights']} weekday+{f['weekend_nights']} weekend",
+        f"room={f['reserved_room_type']}->{f['assigned_room_type']}",
+        f"changes={f['booking_changes']}",
+        f"prev_cancel={f['previous_cancellations']}",
+        f"prev_ok={f['previous_bookings']}",
+        f"deposit={f['deposit_type']}",
+        f"agent={f['agent']}",
+        f"revenue={f['total_revenue']}",
+        f"adr={f['adr']}",
+        f"status={f['status']}@{date(f['status_date'])}",
+        f"special_requests={f['special_requests']}",
+        f"parking={f['parking']}",
+        f"customer={f['customer_type']}",
+        f"canceled={yes_no(f['canceled'] == 'canceled')}",
+        f"repeated={yes_no(f['repeated'] == 'a repeated guest')}",
+        f"weekend_arrival={yes_no(f['weekend'] == 'on a weekend')}",
+        f"holiday={yes_no(f['holiday'] == 'during')}",
+        f"waiting_days={f['waiting']}",
+    ])
+
+
+@timed("pre_processing.dataframe_to_text")
 def dataframe_to_text(dataframe: pd.DataFrame, global_metrics: dict, save_dir: str):
     """
     Convert a dataframe and global_metrics to text dataframe
@@ -57,13 +130,13 @@ def dataframe_to_text(dataframe: pd.DataFrame, global_metrics: dict, save_dir: s
     # Convert all float to int 
     revenue_per_month = revenue_per_month.astype(int)
     revenue_per_month['text_data'] = revenue_per_month.apply(func1, axis=1)
-    revenue_per_month = revenue_per_month.drop(columns=['year', 'month', 'total_revenue'])
+    revenue_per_month = revenue_per_month.drop(columns=['total_revenue'])
     # 3. Revenue per market segment
     revenue_per_market_segment = gm.get('revenue_per_market_segment')
     def func2(row):
         return f"The {row['market_segment']} segment generated a total revenue of {row['total_revenue']:.2f} USD from hotel bookings."
     revenue_per_market_segment['text_data'] = revenue_per_market_segment.apply(func2, axis=1)
-    revenue_per_market_segment = revenue_per_market_segment.drop(columns=['market_segment', 'total_revenue'])
+    revenue_per_market_segment = revenue_per_market_segment.drop(columns=['total_revenue'])
     # 4. Revenue per meal plan
     revenue_per_meal_plan = gm.get('revenue_per_meal_plan')
     def func3(row):
@@ -75,13 +148,13 @@ def dataframe_to_text(dataframe: pd.DataFrame, global_metrics: dict, save_dir: s
     def func4(row):
         return f"The {row['hotel']} hotel had a total of {row['is_canceled']} cancellations."
     cancellations_by_hotel['text_data'] = cancellations_by_hotel.apply(func4, axis=1)
-    cancellations_by_hotel = cancellations_by_hotel.drop(columns=['hotel', 'is_canceled'])
+    cancellations_by_hotel = cancellations_by_hotel.drop(columns=['is_canceled'])
     # 6. Cancellations by country
     cancellations_by_country = gm.get('cancellations_by_country')
     def func5(row):
         return f"The country {row['country']} had a total of {row['is_canceled']} cancellations."
     cancellations_by_country['text_data'] = cancellations_by_country.apply(func5, axis=1)
-    cancellations_by_country = cancellations_by_country.drop(columns=['country', 'is_canceled'])
+    cancellations_by_country = cancellations_by_country.drop(columns=['is_canceled'])
     # 7. Cancellations by customer type
     cancellations_by_customer_type = gm.get('cancellations_by_customer_type')
     def func6(row):
@@ -103,13 +176,13 @@ def dataframe_to_text(dataframe: pd.DataFrame, global_metrics: dict, save_dir: s
     def func8(row):
         return f"The {row['hotel']} hotel had an occupancy rate of {row['occupancy_rate']:.2f}%."
     occupancy_rate_per_hotel['text_data'] = occupancy_rate_per_hotel.apply(func8, axis=1)
-    occupancy_rate_per_hotel = occupancy_rate_per_hotel.drop(columns=['hotel', 'occupancy_rate'])
+    occupancy_rate_per_hotel = occupancy_rate_per_hotel.drop(columns=['occupancy_rate'])
     # 12. Demand Per Market Segment
     demand_per_market_segment = gm.get('demand_per_market_segment')
     def func9(row):
         return f"The {row['market_segment']} market segment had a total of {row['booking_count']} bookings."
     demand_per_market_segment['text_data'] = demand_per_market_segment.apply(func9, axis=1)
-    demand_per_market_segment = demand_per_market_segment.drop(columns=['market_segment', 'booking_count'])
+    demand_per_market_segment = demand_per_market_segment.drop(columns=['booking_count'])
     # 13. Percentage of Families
     percentage_families = gm.get('percentage_families')
     # 14. Percentage of Repeated Guests
@@ -121,7 +194,7 @@ def dataframe_to_text(dataframe: pd.DataFrame, global_metrics: dict, save_dir: s
     def func10(row):
         return f"In {row['year']}, the total number of bookings for {row['month']} was {row['total_bookings']}."
     booking_trend_over_time['text_data'] = booking_trend_over_time.apply(func10, axis=1)
-    booking_trend_over_time = booking_trend_over_time.drop(columns=['year', 'month', 'total_bookings'])
+    booking_trend_over_time = booking_trend_over_time.drop(columns=['total_bookings'])
     # 17. Busiest weeks
     busiest_weeks = gm.get('busiest_weeks')
     def func11(row):
@@ -139,7 +212,7 @@ def dataframe_to_text(dataframe: pd.DataFrame, global_metrics: dict, save_dir: s
     def func13(row):
         return f"In {row['year']}, the total number of days on the waiting list for {row['month']} was {row['average_waiting_list_days']}."
     waiting_list_trend['text_data'] = waiting_list_trend.apply(func13, axis=1)
-    waiting_list_trend = waiting_list_trend.drop(columns=['year', 'month', 'average_waiting_list_days'])
+    waiting_list_trend = waiting_list_trend.drop(columns=['average_waiting_list_days'])
 
 
     # Merge into Single df 
@@ -149,8 +222,8 @@ def dataframe_to_text(dataframe: pd.DataFrame, global_metrics: dict, save_dir: s
         booking_trend_over_time, busiest_weeks, holiday_season_effect, waiting_list_trend
     ])
 
-    # Remove any extra columns other than 'text_data' 
-    global_metrics_df = global_metrics_df[['text_data']]
+    # Keep only 'text_data' and the attributes the metrics are broken down by (metadata of the documents)
+    global_metrics_df = global_metrics_df.reindex(columns=['text_data'] + GLOBAL_METRIC_ATTRIBUTES)
 
     # Make dataFrame with proper text details based on Single metrics
     single_metrics = pd.DataFrame({
@@ -170,4 +243,76 @@ def dataframe_to_text(dataframe: pd.DataFrame, global_metrics: dict, save_dir: s
     # save 
     global_metrics_df.to_csv(f"{save_dir}/global_metrics_df.csv", index=False)
 
-    return data, global_metrics_df
\ No newline at end of file
+    return data, global_metrics_df
+
+def build_corpus(text_df: pd.DataFrame, global_metrics_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Merge the booking text data and the global metrics text into the corpus that is embedded and upserted.
+
+    Args:
+        text_df (pd.DataFrame): The dataframe returned by dataframe_to_text (or read from text_data.csv), with the
+            booking attributes in METADATA_COLUMNS.
+        global_metrics_df (pd.DataFrame): The global metrics text dataframe, with the GLOBAL_METRIC_ATTRIBUTES the
+            metrics are broken down by (as returned by dataframe_to_text).
+
+    Returns:
+        pd.DataFrame: The corpus with an 'id' column matching the vector ids ('vector_1', 'vector_2', ...), a 'text_data'
+        column and the METADATA_COLUMNS (missing attributes are NaN, e.g. is_canceled of global metric documents).
+
+    Raises:
+        ValueError: If text_df does not have the booking attribute columns.
+    """
+    booking_columns = [col for col in METADATA_COLUMNS if col != 'doc_type']
+    missing = [col for col in ['text_data'] + booking_columns if col not in text_df.columns]
+    if missing:
+        raise ValueError(
+            f"Booking text data is missing the columns {missing}, build the corpus from the full dataframe "
+            "returned (and saved as text_data.csv) by dataframe_to_text, not from the 'text_data' column only."
+        )
+    global_columns = [col for col in GLOBAL_METRIC_ATTRIBUTES if col in global_metrics_df.columns]
+    global_docs = global_metrics_df[['text_data'] + global_columns].assign(doc_type='global_metric')
+    booking_docs = text_df[['text_data'] + booking_columns].assign(doc_type='booking')
+
+    # Same order as the upsert notebook, so that document positions line up with the vector ids
+    corpus = pd.concat([global_docs, booking_docs], axis=0).reset_index(drop=True)
+    corpus = corpus.dropna(subset=['text_data']).reset_index(drop=True)
+    corpus = corpus.reindex(columns=['text_data'] + METADATA_COLUMNS)
+    corpus.insert(0, 'id', [f"vector_{num}" for num in range(1, len(corpus) + 1)])
+    return corpus
+
+
+def to_metadata_value(value):
+    """
+    Convert a dataframe value to a type accepted as vector metadata (str, int, float), or None when missing.
+    """
+    if pd.isna(value):
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return int(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return int(value) if float(value).is_integer() else float(value)
+    return str(value)
+
+
+def corpus_to_vectors(corpus: pd.DataFrame, embeddings) -> list:
+    """
+    Build the Pinecone upsert payload for the corpus, with the text and the structured attributes as metadata.
+
+    Args:
+        corpus (pd.DataFrame): The corpus returned by build_corpus.
+        embeddings: The corpus embeddings, in the same order as the corpus.
+
+    Returns:
+        list: Vectors in Pinecone format ({'id', 'values', 'metadata'}).
+    """
+    vectors = []
+    for row, e in zip(corpus.itertuples(index=False), embeddings):
+        metadata = {"text": row.text_data}
+        for col in METADATA_COLUMNS:
+            value = to_metadata_value(getattr(row, col))
+            if value is not None:
+                metadata[col] = value
+        vectors.append({"id": row.id, "values": e, "metadata": metadata})
+    return vectors
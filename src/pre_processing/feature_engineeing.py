@@ -1,7 +1,10 @@
 import pandas as pd 
 import numpy as np 
 
+from src.monitoring.metrics import timed
 
+
+@timed("pre_processing.build_features_for_analytics")
 def build_features_for_analytics(dataframe: pd.DataFrame)-> pd.DataFrame:
     """
     Function to build features from the dataset.
@@ -27,6 +30,7 @@ def build_features_for_analytics(dataframe: pd.DataFrame)-> pd.DataFrame:
     return df
     
 
+@timed("pre_processing.build_features_for_rag")
 def build_features_for_rag(dataframe: pd.DataFrame, verbose: bool = False)-> pd.DataFrame:
     """
     Function to build features from the dataset.
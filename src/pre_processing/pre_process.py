@@ -2,7 +2,10 @@
 import pandas as pd 
 import numpy as np
 
+from src.monitoring.metrics import timed
 
+
+@timed("pre_processing.pre_process_data")
 def pre_process_data(dataframe: pd.DataFrame, save_dir: str = None) -> pd.DataFrame:
     """
     Function to pre-process the data before performing any analytics on it.
@@ -1,19 +1,30 @@
 import pandasai as pai 
 from dotenv import load_dotenv
 import os
+import threading
+
+from src.qna_with_data.sql_engine import get_sql_engine
 
 load_dotenv()
 
 class QNAEngine:
+    # DataFrames loaded by pandasai, shared across instances so the CSV is read once per path
+    _pandasai_frames = {}
+    _pandasai_lock = threading.Lock()
+
     def __init__(self, query: str, dataframe_path: str):
         self.query = query
         self.dataframe_path = dataframe_path
 
-    def chat_using_sql_chain(self): 
+    def chat_using_sql_chain(self, timeout: float = 30.0): 
         """
-        Chat with the SQL chain model
+        Chat with the SQL chain model: the LLM writes the SQL, which runs on the embedded SQLite copy of the
+        dataframe (loaded once per path and shared across requests)
+
+        Args:
+            timeout (float): Seconds to wait for the SQL generation by the LLM.
         """
-        pass
+        return get_sql_engine(self.dataframe_path).ask(self.query, timeout)
     
     def chat_using_pandasai(self):
         """
@@ -25,7 +36,10 @@ class QNAEngine:
             raise ValueError("Pandas API key is missing.")
         pai.api_key.set(pandas_api) # Set api key
 
-        df = pai.read_csv(self.dataframe_path) # read DataFrame
+        with QNAEngine._pandasai_lock:
+            if self.dataframe_path not in QNAEngine._pandasai_frames:
+                QNAEngine._pandasai_frames[self.dataframe_path] = pai.read_csv(self.dataframe_path) # read DataFrame
+            df = QNAEngine._pandasai_frames[self.dataframe_path]
         
         # Generate response
         try:
@@ -0,0 +1,92 @@
+import re
+
+from src.pre_processing.data_transformation import compact_text
+
+
+WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def approximate_token_count(text: str) -> int:
+    """
+    Fallback token counter when no tokenizer is available: words and punctuation marks.
+    """
+    return len(WORD_PATTERN.findall(text))
+
+
+def _shingles(text: str) -> set:
+    return set(text.lower().split())
+
+
+class ContextBuilder:
+    """
+    Assembles the retrieved passages into the LLM context under a token budget.
+
+    Hits below the similarity threshold are dropped, near-identical passages are deduplicated, the remaining passages
+    are rendered compactly (see compact_text) and added in ranking order until the budget is reached.
+    """
+    def __init__(self, max_tokens: int = 384, min_score: float = 0.2, dedupe_threshold: float = 0.9, count_tokens=None):
+        """
+        Args:
+            max_tokens (int): Token budget for the whole context.
+            min_score (float): Hits with a vector similarity below this are dropped (keyword-only hits have no similarity and are kept).
+            dedupe_threshold (float): Jaccard similarity of the passage words above which a passage counts as a duplicate.
+            count_tokens (callable): Token counter, text -> int. Defaults to approximate_token_count.
+        """
+        self.max_tokens = max_tokens
+        self.min_score = min_score
+        self.dedupe_threshold = dedupe_threshold
+        self.count_tokens = count_tokens or approximate_token_count
+
+
+    def _truncate(self, passage: str, max_tokens: int) -> str:
+        # Cut words proportionally until the passage fits the remaining budget
+        words = passage.split()
+        while words and self.count_tokens(" ".join(words)) > max_tokens:
+            words = words[:min(len(words) - 1, int(len(words) * max_tokens / self.count_tokens(" ".join(words))))]
+        return " ".join(words)
+
+
+    def build(self, hits: list) -> tuple:
+        """
+        Build the context from the retrieved hits.
+
+        Args:
+            hits (list): Hits as returned by RAGEngine.retrieve (dicts with 'text' and 'vector_score'), best first.
+
+        Returns:
+            tuple: The context string and a dict of stats (passage counts and 'context_tokens').
+        """
+        stats = {
+            "passages_retrieved": len(hits), "passages_used": 0, "dropped_low_score": 0,
+            "dropped_duplicate": 0, "dropped_budget": 0, "context_tokens": 0
+        }
+        lines, kept_shingles = [], []
+        for hit in hits:
+            score = hit.get('vector_score')
+            if score is not None and score < self.min_score:
+                stats["dropped_low_score"] += 1
+                continue
+
+            passage = compact_text(hit.get('text'))
+            shingles = _shingles(passage)
+            if any(len(shingles & other) / max(len(shingles | other), 1) >= self.dedupe_threshold for other in kept_shingles):
+                stats["dropped_duplicate"] += 1
+                continue
+
+            line = f"[{len(lines) + 1}] {passage}"
+            remaining = self.max_tokens - stats["context_tokens"]
+            tokens = self.count_tokens(line) + 1 # +1 for the newline
+            if tokens > remaining:
+                # Only the best passage gets truncated to fit, later ones are dropped whole
+                line = self._truncate(line, remaining - 1) if not lines else ""
+                if not line:
+                    stats["dropped_budget"] += 1
+                    continue
+                tokens = self.count_tokens(line) + 1
+
+            lines.append(line)
+            kept_shingles.append(shingles)
+            stats["context_tokens"] += tokens
+            stats["passages_used"] += 1
+
+        return "\n".join(lines), stats
@@ -0,0 +1,187 @@
+import re
+from collections import Counter
+
+import numpy as np
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list:
+    """
+    Lowercase the text and split it into alphanumeric tokens, so that exact tokens like 'AGO', '2017' or agent numbers survive.
+    """
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class BM25Index:
+    """
+    Local BM25 keyword index over the RAG corpus.
+
+    The postings are kept in flat numpy arrays (CSR layout: one offsets array per term into a doc id / term frequency array),
+    and the document texts in a single utf-8 blob, so the whole index is persisted as one compact .npz file.
+    """
+    def __init__(self, vocab, term_ptr, post_docs, post_tfs, doc_lens, ids, text_blob, text_ptr, k1=1.5, b=0.75):
+        self.vocab = vocab
+        self.term_ptr = term_ptr
+        self.post_docs = post_docs
+        self.post_tfs = post_tfs
+        self.doc_lens = doc_lens
+        self.ids = ids
+        self.text_blob = text_blob
+        self.text_ptr = text_ptr
+        self.k1 = k1
+        self.b = b
+
+        self.term_to_idx = {term: i for i, term in enumerate(vocab.tolist())}
+        self.num_docs = len(doc_lens)
+        # Per term idf and per doc length normalization are fixed, precompute them once
+        doc_freqs = np.diff(term_ptr).astype(np.float32)
+        self.idf = np.log(1 + (self.num_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        avg_len = doc_lens.mean() if self.num_docs else 0.0
+        self.length_norm = (k1 * (1 - b + b * doc_lens / max(avg_len, 1e-9))).astype(np.float32)
+
+
+    @classmethod
+    def build(cls, texts: list, ids: list = None, **kwargs):
+        """
+        Build the index from a list of documents.
+
+        Args:
+            texts (list): The corpus documents.
+            ids (list): The document ids (defaults to 'vector_1', 'vector_2', ... as used for the upserted vectors).
+
+        Returns:
+            BM25Index: The built index.
+        """
+        if ids is None:
+            ids = [f"vector_{num}" for num in range(1, len(texts) + 1)]
+        if len(ids) != len(texts):
+            raise ValueError("Number of ids does not match number of texts.")
+
+        postings = {}
+        doc_lens = np.zeros(len(texts), dtype=np.int32)
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lens[doc] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((doc, tf))
+
+        vocab = sorted(postings)
+        term_ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        term_ptr[1:] = np.cumsum([len(postings[term]) for term in vocab])
+        post_docs = np.empty(term_ptr[-1], dtype=np.int32)
+        post_tfs = np.empty(term_ptr[-1], dtype=np.uint16)
+        for i, term in enumerate(vocab):
+            entries = np.asarray(postings[term], dtype=np.int64)
+            post_docs[term_ptr[i]:term_ptr[i + 1]] = entries[:, 0]
+            post_tfs[term_ptr[i]:term_ptr[i + 1]] = np.minimum(entries[:, 1], np.iinfo(np.uint16).max)
+
+        encoded = [str(text).encode("utf-8") for text in texts]
+        text_ptr = np.zeros(len(encoded) + 1, dtype=np.int64)
+        text_ptr[1:] = np.cumsum([len(e) for e in encoded])
+        text_blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+        return cls(
+            np.array(vocab, dtype=str), term_ptr, post_docs, post_tfs, doc_lens,
+            np.array(ids, dtype=str), text_blob, text_ptr, **kwargs
+        )
+
+
+    def save(self, path: str):
+        """
+        Persist the index arrays to a single .npz file.
+        """
+        np.savez_compressed(
+            path, vocab=self.vocab, term_ptr=self.term_ptr, post_docs=self.post_docs, post_tfs=self.post_tfs,
+            doc_lens=self.doc_lens, ids=self.ids, text_blob=self.text_blob, text_ptr=self.text_ptr
+        )
+
+
+    @classmethod
+    def load(cls, path: str, **kwargs):
+        """
+        Load an index saved with BM25Index.save.
+        """
+        with np.load(path) as data:
+            return cls(
+                data['vocab'], data['term_ptr'], data['post_docs'], data['post_tfs'], data['doc_lens'],
+                data['ids'], data['text_blob'], data['text_ptr'], **kwargs
+            )
+
+
+    def get_text(self, doc: int) -> str:
+        """
+        Return the text of the document at the given position.
+        """
+        return self.text_blob[self.text_ptr[doc]:self.text_ptr[doc + 1]].tobytes().decode("utf-8")
+
+
+    def search(self, query: str, topk: int, doc_mask: np.ndarray = None) -> list:
+        """
+        Score the corpus against the query with BM25.
+
+        Args:
+            query (str): The user query.
+            topk (int): Number of documents to return.
+            doc_mask (np.ndarray): Optional boolean mask over document positions (e.g. from MetadataIndex.mask);
+                only these documents are scored.
+
+        Returns:
+            list: (doc position, score) tuples sorted by descending score.
+        """
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            idx = self.term_to_idx.get(term)
+            if idx is None:
+                continue
+            start, end = self.term_ptr[idx], self.term_ptr[idx + 1]
+            docs = self.post_docs[start:end]
+            tfs = self.post_tfs[start:end].astype(np.float32)
+            if doc_mask is not None:
+                keep = doc_mask[docs]
+                docs, tfs = docs[keep], tfs[keep]
+            # Doc ids are unique within a posting list, so fancy-index accumulation is safe
+            scores[docs] += self.idf[idx] * tfs * (self.k1 + 1) / (tfs + self.length_norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) == 0:
+            return []
+        if len(matched) > topk:
+            matched = matched[np.argpartition(-scores[matched], topk - 1)[:topk]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(doc), float(scores[doc])) for doc in matched]
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> list:
+    """
+    Fuse several ranked lists of document ids with reciprocal rank fusion.
+
+    Args:
+        rankings (list): Lists of document ids, each sorted from best to worst.
+        k (int): The RRF damping constant.
+
+    Returns:
+        list: (document id, fused score) tuples sorted by descending score.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def build_keyword_index(corpus, save_path: str = "data/structured/keyword_index.npz") -> BM25Index:
+    """
+    Build the BM25 index from the corpus returned by build_corpus and persist it.
+
+    Args:
+        corpus (pd.DataFrame): The corpus with 'id' and 'text_data' columns.
+        save_path (str): Where to save the index.
+
+    Returns:
+        BM25Index: The built index.
+    """
+    index = BM25Index.build(corpus['text_data'].tolist(), corpus['id'].tolist())
+    index.save(save_path)
+    return index
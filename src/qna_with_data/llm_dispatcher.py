@@ -0,0 +1,322 @@
+import time
+import queue
+import random
+import hashlib
+import threading
+import itertools
+import contextvars
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from src.monitoring.metrics import Gauge, REGISTRY, record_cache, record_span
+
+
+LLM_QUEUE_DEPTH = Gauge("llm_queue_depth", "LLM requests waiting for a dispatch slot.")
+REGISTRY.append(LLM_QUEUE_DEPTH)
+
+
+class QueueFullError(RuntimeError):
+    """
+    Raised when the dispatch queue is full, the caller should back off (HTTP 503).
+    """
+
+
+class DeadlineExceededError(TimeoutError):
+    """
+    Raised when a request could not be dispatched before its deadline.
+    """
+
+
+class RateLimitError(RuntimeError):
+    """
+    Rate limit error of the stub backend (same status code as the provider's).
+    """
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _retry_after(error: Exception):
+    """
+    Seconds to wait before retrying, if the error is a rate limit (HTTP 429) error; None otherwise.
+    """
+    if getattr(error, "status_code", None) != 429:
+        return None
+    retry_after = getattr(error, "retry_after", None)
+    response = getattr(error, "response", None)
+    if retry_after is None and response is not None:
+        retry_after = response.headers.get("retry-after")
+    try:
+        return float(retry_after) if retry_after is not None else 0.0
+    except ValueError:
+        return 0.0
+
+
+class GroqBackend:
+    """
+    Completion backend on the Groq chat completions API.
+    """
+    def __init__(self, client):
+        self.client = client
+
+
+    def complete(self, prompt: str, model: str) -> str:
+        chat_completion = self.client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=model,
+        )
+        return chat_completion.choices[0].message.content
+
+
+class StubBackend:
+    """
+    Local completion backend for offline load tests: answers after a fixed latency, and can enforce a
+    requests-per-minute quota by raising rate limit errors like the provider.
+    """
+    def __init__(self, latency: float = 0.5, quota_per_minute: int = None):
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.calls = 0
+        self.call_times = []
+        self.lock = threading.Lock()
+
+
+    def complete(self, prompt: str, model: str) -> str:
+        with self.lock:
+            now = time.monotonic()
+            if self.quota_per_minute is not None:
+                self.call_times = [t for t in self.call_times if now - t < 60]
+                if len(self.call_times) >= self.quota_per_minute:
+                    raise RateLimitError("Stub quota exceeded", retry_after=60 - (now - self.call_times[0]))
+                self.call_times.append(now)
+            self.calls += 1
+        time.sleep(self.latency)
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        return f"[stub {model}] answer {digest}"
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`.
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+
+    def _wait_time(self, amount: float) -> float:
+        # Reserve the tokens, the balance may go negative: the wait returned is when it is paid back
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        return max(0.0, -self.tokens / self.rate)
+
+
+    def reserve(self, amount: float = 1, deadline: float = None) -> float:
+        """
+        Take `amount` tokens without waiting for them.
+
+        Returns:
+            float: Seconds until the tokens are available.
+
+        Raises:
+            DeadlineExceededError: If the tokens would only be available after the deadline (nothing is taken).
+        """
+        amount = min(amount, self.capacity)
+        with self.lock:
+            wait = self._wait_time(amount)
+            if deadline is not None and time.monotonic() + wait > deadline:
+                self.tokens += amount # give the reservation back
+                raise DeadlineExceededError("Rate limit wait exceeds the request deadline.")
+        return wait
+
+
+    def refund(self, amount: float = 1):
+        """
+        Give back tokens taken with reserve, when the request is not sent after all.
+        """
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+
+
+    def acquire(self, amount: float = 1, deadline: float = None):
+        """
+        Take `amount` tokens, sleeping until they are available.
+
+        Raises:
+            DeadlineExceededError: If the tokens would only be available after the deadline (nothing is taken).
+        """
+        wait = self.reserve(amount, deadline)
+        if wait:
+            time.sleep(wait)
+
+
+class _Job:
+    def __init__(self, prompt, model, priority, deadline):
+        self.prompt = prompt
+        self.model = model
+        self.priority = priority
+        self.deadline = deadline
+        self.future = Future()
+        self.enqueued = time.monotonic()
+        self.context = contextvars.copy_context() # spans go to the profile of the first requester
+
+
+class LLMDispatcher:
+    """
+    Dispatch layer in front of the LLM provider.
+
+    - Identical in-flight requests (same model and prompt) are coalesced and share one completion.
+    - Requests wait in a bounded priority queue (lower number first) and are dispatched by worker threads
+      through token buckets matched to the provider quota (requests and tokens per minute).
+    - Requests not dispatched before their deadline fail with DeadlineExceededError, rate limit errors
+      from the provider are retried with backoff.
+    """
+    def __init__(self, backend, requests_per_minute: float = 30, tokens_per_minute: float = 6000, max_queue: int = 64,
+        workers: int = 4, max_retries: int = 3, completion_tokens: int = 256, count_tokens=None
+    ):
+        """
+        Args:
+            backend: The completion backend (GroqBackend, StubBackend), with complete(prompt, model) -> str.
+            requests_per_minute (float): Request quota of the provider, None to disable.
+            tokens_per_minute (float): Token quota of the provider (prompt + completion), None to disable.
+            max_queue (int): Maximum number of queued requests, beyond it submit raises QueueFullError.
+            workers (int): Number of concurrent calls to the backend.
+            max_retries (int): Retries of a request after rate limit errors.
+            completion_tokens (int): Estimated completion tokens counted against the token quota.
+            count_tokens (callable): Prompt token counter, defaults to ~4 characters per token.
+        """
+        self.backend = backend
+        self.request_bucket = TokenBucket(requests_per_minute / 60, requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.completion_tokens = completion_tokens
+        self.count_tokens = count_tokens or (lambda text: len(text) // 4 + 1)
+
+        self.queue = queue.PriorityQueue(maxsize=max_queue)
+        self.sequence = itertools.count() # FIFO order within a priority
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+
+    def submit(self, prompt: str, model: str, priority: int = 0, timeout: float = None) -> Future:
+        """
+        Queue a completion request.
+
+        Args:
+            prompt (str): The prompt.
+            model (str): The model name.
+            priority (int): Lower numbers are dispatched first.
+            timeout (float): Seconds within which the request must be dispatched, None for no deadline.
+
+        Returns:
+            Future: Resolves to the completion text.
+
+        Raises:
+            QueueFullError: If the queue is full.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        key = (model, prompt)
+        with self.lock:
+            job = self.in_flight.get(key)
+            record_cache("llm_coalesce", job is not None)
+            if job is not None:
+                # Share the pending call, it must now also serve this request's deadline
+                if job.deadline is not None:
+                    job.deadline = None if deadline is None else max(job.deadline, deadline)
+                return job.future
+
+            job = _Job(prompt, model, priority, deadline)
+            try:
+                self.queue.put_nowait((priority, next(self.sequence), job))
+            except queue.Full:
+                raise QueueFullError("LLM request queue is full.")
+            self.in_flight[key] = job
+            LLM_QUEUE_DEPTH.inc()
+        job.future.add_done_callback(lambda _: self._release(key, job))
+        return job.future
+
+
+    def complete(self, prompt: str, model: str, priority: int = 0, timeout: float = None) -> str:
+        """
+        Submit a request and wait for the completion.
+
+        Args:
+            timeout (float): Seconds to wait for the completion (dispatch and LLM call), None to wait without limit.
+                A coalesced request shares the dispatch deadline of the others, but each caller stops waiting
+                after its own timeout.
+
+        Raises:
+            DeadlineExceededError: If the completion is not available within the timeout.
+        """
+        future = self.submit(prompt, model, priority, timeout)
+        try:
+            return future.result(timeout)
+        except DeadlineExceededError:
+            raise
+        except FutureTimeoutError:
+            raise DeadlineExceededError("LLM request did not complete before the deadline.")
+
+
+    def _release(self, key, job):
+        with self.lock:
+            if self.in_flight.get(key) is job:
+                del self.in_flight[key]
+
+
+    def _worker(self):
+        while True:
+            _, _, job = self.queue.get()
+            LLM_QUEUE_DEPTH.dec()
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                job.future.set_result(job.context.run(self._dispatch, job))
+            except Exception as e:
+                job.future.set_exception(e)
+
+
+    def _dispatch(self, job) -> str:
+        if job.deadline is not None and time.monotonic() > job.deadline:
+            raise DeadlineExceededError("LLM request expired in the queue.")
+        # Reserve on both buckets or on none: a request rejected by one must not keep the other's tokens
+        reserved, wait = [], 0.0
+        try:
+            for bucket, amount in (
+                (self.request_bucket, 1),
+                (self.token_bucket, self.count_tokens(job.prompt) + self.completion_tokens),
+            ):
+                if bucket is not None:
+                    wait = max(wait, bucket.reserve(amount, job.deadline))
+                    reserved.append((bucket, amount))
+        except DeadlineExceededError:
+            for bucket, amount in reserved:
+                bucket.refund(amount)
+            raise
+        if wait:
+            time.sleep(wait)
+        record_span("llm.queue_wait", time.monotonic() - job.enqueued)
+
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                response = self.backend.complete(job.prompt, job.model)
+                record_span("llm.backend_call", time.perf_counter() - start)
+                return response
+            except Exception as e:
+                retry_after = _retry_after(e)
+                if retry_after is None or attempt == self.max_retries:
+                    raise
+                # Exponential backoff with jitter, at least what the provider asked for
+                wait = max(retry_after, (2 ** attempt) * (0.5 + random.random() / 2))
+                if job.deadline is not None and time.monotonic() + wait > job.deadline:
+                    raise DeadlineExceededError("Rate limit backoff exceeds the request deadline.") from e
+                time.sleep(wait)
@@ -0,0 +1,194 @@
+import calendar
+
+import numpy as np
+import pandas as pd
+
+from src.pre_processing.data_transformation import METADATA_COLUMNS, to_metadata_value
+
+
+def normalize_value(value) -> str:
+    """
+    Normalize a metadata value to the string key used by the index (2016, 2016.0 and '2016' are the same key, True is 1).
+    """
+    value = to_metadata_value(value)
+    return None if value is None else str(value)
+
+
+# Months are stored as numbers (1-12), filters may also name them ('May', 'may', 'Sep')
+MONTH_NUMBERS = {
+    **{name.lower(): i for i, name in enumerate(calendar.month_name) if name},
+    **{name.lower(): i for i, name in enumerate(calendar.month_abbr) if name},
+}
+
+
+def normalize_filter_value(attr: str, value):
+    """
+    Convert a filter value to the type stored in the metadata: month names become month numbers.
+
+    Raises:
+        ValueError: If a month is neither a month name nor a number from 1 to 12.
+    """
+    if attr != 'month':
+        return value
+    if isinstance(value, str) and value.strip().lower() in MONTH_NUMBERS:
+        return MONTH_NUMBERS[value.strip().lower()]
+    try:
+        month = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid month '{value}', use a number from 1 to 12 or a month name.")
+    if not month.is_integer() or not 1 <= month <= 12:
+        raise ValueError(f"Invalid month '{value}', use a number from 1 to 12 or a month name.")
+    return int(month)
+
+
+class MetadataIndex:
+    """
+    Local posting-list index over the structured corpus attributes (hotel, year, month, ...).
+
+    For every attribute the sorted document positions of each value are stored in one flat array with an offsets array,
+    so a filter resolves to a candidate set of document positions without touching the documents themselves.
+    Positions line up with the BM25 keyword index built from the same corpus.
+    """
+    def __init__(self, postings: dict, num_docs: int):
+        self.postings = postings # attribute -> (values, ptr, docs)
+        self.num_docs = num_docs
+        self.value_to_idx = {
+            attr: {value: i for i, value in enumerate(values.tolist())}
+            for attr, (values, _, _) in postings.items()
+        }
+
+
+    @classmethod
+    def build(cls, corpus: pd.DataFrame, attributes: list = METADATA_COLUMNS):
+        """
+        Build the index from the corpus returned by build_corpus.
+
+        Args:
+            corpus (pd.DataFrame): The corpus with the metadata columns.
+            attributes (list): The attributes to index.
+
+        Returns:
+            MetadataIndex: The built index.
+        """
+        postings = {}
+        for attr in attributes:
+            if attr not in corpus.columns:
+                continue
+            keys = corpus[attr].map(normalize_value)
+            codes, values = pd.factorize(keys) # missing values get code -1 and are not indexed
+            order = np.argsort(codes, kind="stable")
+            order = order[codes[order] >= 0]
+            ptr = np.zeros(len(values) + 1, dtype=np.int64)
+            ptr[1:] = np.cumsum(np.bincount(codes[codes >= 0], minlength=len(values)))
+            postings[attr] = (np.array(values, dtype=str), ptr, order.astype(np.int32))
+        return cls(postings, len(corpus))
+
+
+    def save(self, path: str):
+        """
+        Persist the posting lists to a single .npz file.
+        """
+        arrays = {"num_docs": np.array(self.num_docs), "attributes": np.array(list(self.postings), dtype=str)}
+        for attr, (values, ptr, docs) in self.postings.items():
+            arrays[f"{attr}__values"] = values
+            arrays[f"{attr}__ptr"] = ptr
+            arrays[f"{attr}__docs"] = docs
+        np.savez_compressed(path, **arrays)
+
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Load an index saved with MetadataIndex.save.
+        """
+        with np.load(path) as data:
+            postings = {
+                attr: (data[f"{attr}__values"], data[f"{attr}__ptr"], data[f"{attr}__docs"])
+                for attr in data['attributes'].tolist()
+            }
+            return cls(postings, int(data['num_docs']))
+
+
+    def _lookup_value(self, attr: str, value) -> np.ndarray:
+        values, ptr, docs = self.postings[attr]
+        idx = self.value_to_idx[attr].get(normalize_value(normalize_filter_value(attr, value)))
+        if idx is None:
+            return np.empty(0, dtype=np.int32)
+        return docs[ptr[idx]:ptr[idx + 1]]
+
+
+    def lookup(self, filters: dict) -> np.ndarray:
+        """
+        Resolve filters to the matching document positions.
+
+        Args:
+            filters (dict): attribute -> value, or list of values (any of them matches). All attributes must match.
+
+        Returns:
+            np.ndarray: Sorted document positions matching every filter.
+
+        Raises:
+            ValueError: If an attribute is not indexed or a month is invalid.
+        """
+        candidate_sets = []
+        for attr, value in filters.items():
+            if attr not in self.postings:
+                raise ValueError(f"Attribute '{attr}' is not indexed.")
+            if isinstance(value, (list, tuple, set)):
+                candidate_sets.append(np.unique(np.concatenate(
+                    [self._lookup_value(attr, v) for v in value] or [np.empty(0, dtype=np.int32)]
+                )))
+            else:
+                candidate_sets.append(self._lookup_value(attr, value))
+
+        if not candidate_sets:
+            return np.arange(self.num_docs, dtype=np.int32)
+        # Intersect starting from the most selective attribute
+        candidate_sets.sort(key=len)
+        candidates = candidate_sets[0]
+        for other in candidate_sets[1:]:
+            if len(candidates) == 0:
+                break
+            candidates = np.intersect1d(candidates, other, assume_unique=True)
+        return candidates
+
+
+    def mask(self, filters: dict) -> np.ndarray:
+        """
+        Same as lookup, as a boolean mask over all document positions.
+        """
+        mask = np.zeros(self.num_docs, dtype=bool)
+        mask[self.lookup(filters)] = True
+        return mask
+
+
+def _to_filter_value(value):
+    # Metadata numbers are stored as numbers, so '2016' from a JSON request must match 2016
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return to_metadata_value(value)
+
+
+def to_pinecone_filter(filters: dict) -> dict:
+    """
+    Translate retrieval filters to a Pinecone metadata filter ($eq for single values, $in for lists).
+
+    Raises:
+        ValueError: If a month is invalid.
+    """
+    pinecone_filter = {}
+    for attr, value in filters.items():
+        if isinstance(value, (list, tuple, set)):
+            pinecone_filter[attr] = {"$in": [_to_filter_value(normalize_filter_value(attr, v)) for v in value]}
+        else:
+            pinecone_filter[attr] = {"$eq": _to_filter_value(normalize_filter_value(attr, value))}
+    return pinecone_filter
+
+
+def build_metadata_index(corpus: pd.DataFrame, save_path: str = "data/structured/metadata_index.npz") -> MetadataIndex:
+    """
+    Build the metadata index from the corpus returned by build_corpus and persist it.
+    """
+    index = MetadataIndex.build(corpus)
+    index.save(save_path)
+    return index
@@ -4,71 +4,220 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 import json 
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from sentence_transformers import SentenceTransformer
 from pinecone import Pinecone 
 from groq import Groq 
 
+from src.qna_with_data.keyword_index import BM25Index, reciprocal_rank_fusion
+from src.qna_with_data.metadata_index import MetadataIndex, to_pinecone_filter
+from src.qna_with_data.context_builder import ContextBuilder
+from src.qna_with_data.llm_dispatcher import LLMDispatcher, GroqBackend
+from src.monitoring.metrics import timed, record_cache
+
 
 class RAGEngine:
     def __init__(self, 
         embedding_model = "sentence-transformers/all-MiniLM-L6-v2", 
         index_name = "hotelbookings", 
         vector_db_api=os.getenv("PINECONE_API_KEY"), 
-        groq_api=os.getenv("GROQ_API_KEY")
+        groq_api=os.getenv("GROQ_API_KEY"),
+        keyword_index_path="data/structured/keyword_index.npz",
+        metadata_index_path="data/structured/metadata_index.npz",
+        candidates_per_retriever=20,
+        context_max_tokens=384,
+        context_min_score=0.2,
+        query_cache_size=1024,
+        search_workers=32,
+        embedder=None,
+        vector_index=None,
+        groq_client=None,
+        llm_dispatcher=None
     ):
-        self.embedder = SentenceTransformer(embedding_model)
-        self.pc = Pinecone(api_key=vector_db_api)
-        self.index = self.pc.Index(index_name)
-        self.groq_client = Groq(api_key=groq_api)
+        # Pre-built clients can be passed in (e.g. the local stand-ins used by the benchmarks)
+        self.embedder = embedder if embedder is not None else SentenceTransformer(embedding_model)
+        if vector_index is not None:
+            self.pc, self.index = None, vector_index
+        else:
+            self.pc = Pinecone(api_key=vector_db_api)
+            self.index = self.pc.Index(index_name)
+        # All completions go through the dispatcher (coalescing, rate limiting), share one across engines
+        # so that they share the provider quota
+        self.groq_client = groq_client
+        if llm_dispatcher is None:
+            if self.groq_client is None:
+                self.groq_client = Groq(api_key=groq_api)
+            llm_dispatcher = LLMDispatcher(GroqBackend(self.groq_client))
+        self.llm_dispatcher = llm_dispatcher
+
+        # Optional BM25 index for hybrid retrieval (built with keyword_index.build_keyword_index)
+        self.keyword_index = None
+        if keyword_index_path and os.path.exists(keyword_index_path):
+            self.keyword_index = BM25Index.load(keyword_index_path)
+        # Optional metadata index serving filters for the keyword search (built with metadata_index.build_metadata_index)
+        self.metadata_index = None
+        if metadata_index_path and os.path.exists(metadata_index_path):
+            self.metadata_index = MetadataIndex.load(metadata_index_path)
+            if self.keyword_index is not None and self.metadata_index.num_docs != self.keyword_index.num_docs:
+                raise ValueError("Metadata index and keyword index were built from different corpora.")
+        self.candidates_per_retriever = candidates_per_retriever
+        # Dense searches of concurrent requests run here while each request thread does its own keyword search,
+        # size it for the expected number of concurrent requests so that they do not queue behind each other
+        self.executor = ThreadPoolExecutor(max_workers=search_workers)
+
+        # LRU cache of query embeddings, repeated questions skip the embedder
+        self.query_cache = OrderedDict()
+        self.query_cache_size = query_cache_size
+        self.query_cache_lock = threading.Lock()
+
+        # Context budget, counted with the local embedder tokenizer (an approximation of the LLM tokenizer)
+        self.context_builder = ContextBuilder(
+            max_tokens=context_max_tokens,
+            min_score=context_min_score,
+            count_tokens=lambda text: len(self.embedder.tokenizer.tokenize(text))
+        )
 
 
-    def query_vector_db(self, query, topk):
+    def _encode_query(self, query):
         """
-        Query the vector database for the most similar vectors to the query vector
+        Embed the query, through the LRU query cache
         """
-        query_vector = self.embedder.encode(query)
+        with self.query_cache_lock:
+            query_vector = self.query_cache.get(query)
+            if query_vector is not None:
+                self.query_cache.move_to_end(query)
+        record_cache("query_embedding", query_vector is not None)
+        if query_vector is not None:
+            return query_vector
 
-        # Query the vector database
-        results = self.index.query(
-            vector=query_vector.tolist(),
-            top_k=topk, 
-            include_metadata=True
-        )
-        context = []
-        for i in results.matches: 
-            context.append(i.metadata.get('text'))
-            context.append(str(i.get('score')))
-        # join into string 
-        context = " ".join(context)
-        return context
-    
+        with timed("rag.embed"):
+            query_vector = self.embedder.encode(query).tolist()
+        with self.query_cache_lock:
+            self.query_cache[query] = query_vector
+            if len(self.query_cache) > self.query_cache_size:
+                self.query_cache.popitem(last=False)
+        return query_vector
 
-    def generate_response(self, user_query, context, model="llama3-70b-8192"):
+
+    def _dense_search(self, query, topk, filters=None):
         """
-        Generate response using an open source llm 
-        """     
-        prompt = f"""
-            You are an AI assistant with access to the following retrieved information from the hotel bookings data.
-            {context}
+        Dense (MiniLM + Pinecone) search, returns the raw matches
+        """
+        query_vector = self._encode_query(query)
+        kwargs = {"filter": to_pinecone_filter(filters)} if filters else {}
+        with timed("rag.vector_query"):
+            results = self.index.query(
+                vector=query_vector,
+                top_k=topk, 
+                include_metadata=True,
+                **kwargs
+            )
+        return results.matches
+
 
-            Using the provided context, answer the following question as accurately and concisely as possible:
+    def _lexical_search(self, query, topk, filters=None):
+        """
+        BM25 search, restricted to the documents matching the filters
+        """
+        doc_mask = None
+        if filters:
+            if self.metadata_index is None:
+                raise ValueError("Filters require the metadata index (data/structured/metadata_index.npz).")
+            with timed("rag.metadata_filter"):
+                doc_mask = self.metadata_index.mask(filters)
+            if not doc_mask.any():
+                return []
+        with timed("rag.keyword_search"):
+            return self.keyword_index.search(query, topk, doc_mask=doc_mask)
 
-            Question: {user_query}
 
-            If the retrieved context is not relevant (score is very low) or does not contain the answer, say "I don't know" instead of making up information.
+    @timed("rag.retrieve")
+    def retrieve(self, query, topk, filters=None):
         """
-        chat_completion = self.groq_client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt,
-                }
-            ],
-            model=model,
-        )
+        Retrieve the topk documents for the query. When the keyword index is available, lexical and vector search
+        run concurrently (the vector search on the executor, the keyword search in the calling thread) and their
+        rankings are fused with reciprocal rank fusion.
+
+        Args:
+            query (str): The user query.
+            topk (int): Number of documents to return.
+            filters (dict): Optional metadata filters, attribute -> value or list of values,
+                e.g. {"hotel": "Resort Hotel", "year": 2016} or {"doc_type": "global_metric"}.
+
+        Returns:
+            list: dicts with 'id', 'text', 'score' (fused score, or vector similarity without keyword index) and 'vector_score'.
+        """
+        if self.keyword_index is None:
+            return [
+                {"id": m.get('id'), "text": m.metadata.get('text'), "score": m.get('score'), "vector_score": m.get('score')}
+                for m in self._dense_search(query, topk, filters)
+            ]
 
-        response = chat_completion.choices[0].message.content
+        num_candidates = max(topk, self.candidates_per_retriever)
+        # The vector search runs in the caller's context, so its spans land in the request profile
+        dense_future = self.executor.submit(contextvars.copy_context().run, self._dense_search, query, num_candidates, filters)
+        try:
+            lexical_hits = self._lexical_search(query, num_candidates, filters)
+        except Exception:
+            dense_future.cancel()
+            raise
+        dense_matches = dense_future.result()
+
+        docs = {}
+        for m in dense_matches:
+            docs[m.get('id')] = {"text": m.metadata.get('text'), "vector_score": m.get('score')}
+        for doc, _ in lexical_hits:
+            doc_id = str(self.keyword_index.ids[doc])
+            if doc_id not in docs:
+                docs[doc_id] = {"text": self.keyword_index.get_text(doc), "vector_score": None}
+
+        fused = reciprocal_rank_fusion([
+            [m.get('id') for m in dense_matches],
+            [str(self.keyword_index.ids[doc]) for doc, _ in lexical_hits]
+        ])
+        return [{"id": doc_id, "score": score, **docs[doc_id]} for doc_id, score in fused[:topk]]
+
+
+    def build_context(self, query, topk, filters=None):
+        """
+        Retrieve the topk documents and assemble them into a compact context within the token budget
+
+        Returns:
+            tuple: The context string and the context stats (passage counts and 'context_tokens').
+        """
+        hits = self.retrieve(query, topk, filters)
+        with timed("rag.context"):
+            return self.context_builder.build(hits)
+
+
+    def query_vector_db(self, query, topk, filters=None):
+        """
+        Query the vector database (and keyword index, if available) for the most relevant documents to the query
+        """
+        context, _ = self.build_context(query, topk, filters)
+        return context
+    
+
+    def generate_response(self, user_query, context, model="llama3-70b-8192", priority=0, timeout=None):
+        """
+        Generate response using an open source llm 
+
+        Args:
+            priority (int): Dispatch priority, lower numbers first.
+            timeout (float): Seconds to wait for the LLM completion (dispatch and call), None for no limit.
+        """     
+        prompt = (
+            "Answer the question accurately and concisely using only these passages from the hotel bookings data. "
+            "If they do not contain the answer, say \"I don't know\".\n"
+            f"{context}\n"
+            f"Question: {user_query}"
+        )
+        with timed("rag.llm_completion"):
+            response = self.llm_dispatcher.complete(prompt, model, priority, timeout)
         return response
         
 
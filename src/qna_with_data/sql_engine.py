@@ -0,0 +1,241 @@
+import os
+import re
+import time
+import queue
+import sqlite3
+import threading
+import itertools
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+from dotenv import load_dotenv
+from groq import Groq
+
+from src.monitoring.metrics import timed, record_cache
+from src.qna_with_data.llm_dispatcher import LLMDispatcher, GroqBackend
+
+load_dotenv()
+
+
+# Columns the generated queries filter and group on the most
+INDEX_COLUMNS = [
+    'hotel', 'year', 'month', 'country', 'market_segment', 'distribution_channel',
+    'customer_type', 'is_canceled', 'arrival_date', 'reservation_status_date'
+]
+
+_db_counter = itertools.count()
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalize a question for the SQL cache: case, surrounding punctuation and whitespace are ignored.
+    """
+    return " ".join(question.lower().strip().strip("?!.").split())
+
+
+def extract_sql(text: str) -> str:
+    """
+    Extract the SQL statement from an LLM answer (drops markdown fences and a trailing semicolon).
+    """
+    fenced = re.search(r"```(?:sql)?\s*(.*?)```", text, flags=re.S | re.I)
+    sql = fenced.group(1) if fenced else text
+    return sql.strip().rstrip(";").strip()
+
+
+class InvalidSQLError(ValueError):
+    """
+    Raised when the LLM does not return a single read-only query.
+    """
+    def __init__(self, message: str, sql: str):
+        super().__init__(message)
+        self.sql = sql
+
+
+def validate_sql(sql: str):
+    """
+    Only a single SELECT statement is allowed (writes are also refused by the read-only connections).
+    """
+    if not re.match(r"^(select|with)\b", sql, flags=re.I):
+        raise ValueError("Only SELECT queries are allowed.")
+    # The first statement ends at the first ';' that completes it (semicolons inside literals do not)
+    for end in (i for i, char in enumerate(sql) if char == ";"):
+        if sqlite3.complete_statement(sql[:end + 1]):
+            if sql[end + 1:].strip():
+                raise ValueError("Only a single SQL statement is allowed.")
+            break
+
+
+class SQLEngine:
+    """
+    Answers questions over the bookings with SQL generated by the LLM, run on an embedded SQLite database.
+
+    The bookings are loaded once into a shared in-memory database with indexes on the common filter columns.
+    Queries run on a pool of read-only connections shared across requests, and the generated SQL is cached
+    by normalized question, so repeated questions skip the LLM entirely.
+    """
+    def __init__(self, dataframe: pd.DataFrame, table_name: str = "bookings", pool_size: int = 4, cache_size: int = 256,
+        max_rows: int = 100, query_timeout: float = 5.0, llm_dispatcher=None, model: str = "llama3-70b-8192", groq_api=os.getenv("GROQ_API_KEY")
+    ):
+        self.table_name = table_name
+        self.max_rows = max_rows
+        self.query_timeout = query_timeout
+        self.model = model
+        self.llm_dispatcher = llm_dispatcher if llm_dispatcher is not None else LLMDispatcher(GroqBackend(Groq(api_key=groq_api)))
+
+        # Shared-cache in-memory database: every connection of this engine sees the same tables
+        self.db_uri = f"file:{table_name}_{next(_db_counter)}?mode=memory&cache=shared"
+        with timed("sql.load"):
+            # This connection owns the database (it lives as long as one connection is open)
+            self.owner = sqlite3.connect(self.db_uri, uri=True, check_same_thread=False)
+            dataframe.to_sql(table_name, self.owner, index=False)
+            for col in INDEX_COLUMNS:
+                if col in dataframe.columns:
+                    self.owner.execute(f'CREATE INDEX "idx_{table_name}_{col}" ON "{table_name}" ("{col}")')
+            self.owner.execute("ANALYZE")
+            self.owner.commit()
+        self.schema = self.owner.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+        ).fetchone()[0]
+
+        self.pool = queue.Queue()
+        for _ in range(pool_size):
+            connection = sqlite3.connect(self.db_uri, uri=True, check_same_thread=False)
+            connection.execute("PRAGMA query_only = ON")
+            self.pool.put(connection)
+
+        self.sql_cache = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_lock = threading.Lock()
+
+
+    @classmethod
+    def from_csv(cls, dataframe_path: str, **kwargs):
+        """
+        Build the engine from the pre-processed bookings CSV.
+        """
+        return cls(pd.read_csv(dataframe_path), **kwargs)
+
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a read-only connection from the pool.
+        """
+        connection = self.pool.get()
+        try:
+            yield connection
+        finally:
+            self.pool.put(connection)
+
+
+    def generate_sql(self, question: str, timeout: float = None) -> str:
+        """
+        Get the SQL for the question, from the cache or generated by the LLM.
+
+        Args:
+            question (str): The question.
+            timeout (float): Seconds to wait for the LLM completion (dispatch and call), None for no limit.
+
+        Raises:
+            InvalidSQLError: If the generated SQL is not a single SELECT query (it is not cached).
+        """
+        key = normalize_question(question)
+        with self.cache_lock:
+            sql = self.sql_cache.get(key)
+            if sql is not None:
+                self.sql_cache.move_to_end(key)
+        record_cache("sql", sql is not None)
+        if sql is not None:
+            return sql
+
+        prompt = (
+            f"SQLite table:\n{self.schema}\n"
+            "Write one SQLite SELECT query answering the question. Months are numbers (1-12), booleans are 0/1. "
+            "Return only the SQL.\n"
+            f"Question: {question}"
+        )
+        with timed("sql.generate"):
+            sql = extract_sql(self.llm_dispatcher.complete(prompt, self.model, timeout=timeout))
+        try:
+            validate_sql(sql)
+        except ValueError as e:
+            raise InvalidSQLError(f"The model did not return a usable query: {e}", sql) from e
+
+        with self.cache_lock:
+            self.sql_cache[key] = sql
+            if len(self.sql_cache) > self.cache_size:
+                self.sql_cache.popitem(last=False)
+        return sql
+
+
+    def run_sql(self, sql: str) -> dict:
+        """
+        Run a read-only query on a pooled connection, interrupted after query_timeout seconds.
+
+        Returns:
+            dict: The 'columns' and the 'rows' (at most max_rows) of the result.
+
+        Raises:
+            sqlite3.OperationalError: If the query fails or exceeds query_timeout.
+        """
+        validate_sql(sql)
+        deadline = time.monotonic() + self.query_timeout
+        with timed("sql.execute"), self.connection() as connection:
+            # Checked every 10k virtual machine steps, a non-zero return aborts the query
+            connection.set_progress_handler(lambda: time.monotonic() > deadline, 10_000)
+            try:
+                cursor = connection.execute(sql)
+                rows = cursor.fetchmany(self.max_rows)
+                columns = [col[0] for col in cursor.description] if cursor.description else []
+            except sqlite3.OperationalError as e:
+                if time.monotonic() > deadline:
+                    raise sqlite3.OperationalError(f"Query exceeded the {self.query_timeout}s time limit.") from e
+                raise
+            finally:
+                connection.set_progress_handler(None, 0)
+        return {"columns": columns, "rows": [list(row) for row in rows]}
+
+
+    def ask(self, question: str, timeout: float = None) -> dict:
+        """
+        Answer a question with SQL.
+
+        Args:
+            question (str): The question.
+            timeout (float): Seconds to wait for the SQL generation by the LLM, None for no limit.
+
+        Returns:
+            dict: The 'sql' and its 'columns' and 'rows', or an 'error' if no usable query was generated or it failed.
+        """
+        try:
+            sql = self.generate_sql(question, timeout)
+        except InvalidSQLError as e:
+            return {"sql": e.sql, "error": str(e)}
+        try:
+            return {"sql": sql, **self.run_sql(sql)}
+        except (sqlite3.Error, ValueError) as e:
+            # Do not keep serving a query that fails
+            with self.cache_lock:
+                self.sql_cache.pop(normalize_question(question), None)
+            return {"sql": sql, "error": str(e)}
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_sql_engine(dataframe_path: str, dataframe: pd.DataFrame = None, **kwargs) -> SQLEngine:
+    """
+    Return the SQL engine of the bookings at dataframe_path, loading it on first use only.
+
+    Args:
+        dataframe_path (str): The pre-processed bookings CSV, also the key of the engine.
+        dataframe (pd.DataFrame): The already loaded bookings, to skip reading the CSV.
+    """
+    with _engines_lock:
+        if dataframe_path not in _engines:
+            _engines[dataframe_path] = (
+                SQLEngine(dataframe, **kwargs) if dataframe is not None else SQLEngine.from_csv(dataframe_path, **kwargs)
+            )
+        return _engines[dataframe_path]
@@ -0,0 +1,59 @@
+import matplotlib
+matplotlib.use("Agg")
+
+import pytest
+
+from benchmarks.synthetic_data import generate_bookings
+from src.pre_processing.pre_process import pre_process_data
+from src.analytics.get_analytics import AnalyticsRenderer, prepare_dataframe, render_plot, resolve_plot_options, IMAGE_FORMATS
+
+
+@pytest.fixture(scope="module")
+def bookings():
+    return pre_process_data(generate_bookings(300, seed=0))
+
+
+@pytest.mark.parametrize("image_format", list(IMAGE_FORMATS))
+def test_renders_are_byte_identical(bookings, image_format):
+    # Strong ETags: the same plot and options must always give the same bytes
+    df = prepare_dataframe(bookings)
+    first = render_plot(df, "revenue_trends", image_format)
+    assert first == render_plot(df, "revenue_trends", image_format)
+    assert first == render_plot(prepare_dataframe(bookings), "revenue_trends", image_format)
+
+
+def test_etag_depends_on_data_and_normalized_options(bookings):
+    renderer = AnalyticsRenderer(bookings)
+    assert renderer.etag("revenue_trends", "svg", 100) == renderer.etag("revenue_trends", "svg", "100.0")
+    assert renderer.etag("revenue_trends", "png", None, [8, 4]) == renderer.etag("revenue_trends", "png", None, ("8", 4.0))
+    assert renderer.etag("revenue_trends", "png") != renderer.etag("revenue_trends", "webp")
+
+    changed = bookings.copy()
+    changed.loc[changed.index[0], "adr"] += 1
+    assert AnalyticsRenderer(changed).etag("revenue_trends") != renderer.etag("revenue_trends")
+    assert AnalyticsRenderer(bookings.copy()).etag("revenue_trends") == renderer.etag("revenue_trends")
+
+
+def test_render_is_cached_by_etag(bookings):
+    renderer = AnalyticsRenderer(bookings)
+    image, etag = renderer.render("cancellation_rate", "svg", 80)
+    assert image.startswith(b"<?xml")
+    assert renderer.render("cancellation_rate", "svg", "80")[0] is image
+    assert list(renderer.cache) == [etag]
+
+
+@pytest.mark.parametrize("options", [
+    {"size": "12"}, {"size": "1234"}, {"size": [8]}, {"size": [8, 4, 2]}, {"size": {"w": 8, "h": 4}}, {"size": [8, "x"]},
+    {"size": [0.5, 4]}, {"dpi": "high"}, {"dpi": 5000}, {"format": "gif"}, {"format": ["png"]},
+])
+def test_invalid_plot_options_are_rejected(options):
+    with pytest.raises(ValueError):
+        resolve_plot_options(plot_options={"revenue_trends": options})
+
+
+def test_resolve_plot_options_applies_and_normalizes_overrides():
+    options = resolve_plot_options("webp", "100", ("6", 4), {"revenue_trends": {"format": "svg", "size": [8, 4]}})
+    assert options["revenue_trends"] == ("svg", 100.0, (8.0, 4.0))
+    assert options["cancellation_rate"] == ("webp", 100.0, (6.0, 4.0))
+    with pytest.raises(ValueError):
+        resolve_plot_options(plot_options={"unknown_plot": {}})
@@ -0,0 +1,95 @@
+import pytest
+
+from benchmarks.synthetic_data import generate_bookings
+from src.pre_processing.pre_process import pre_process_data
+from src.pre_processing.feature_engineeing import build_features_for_rag
+from src.pre_processing.data_transformation import row_to_text, compact_text, BOOKING_TEXT_PATTERN
+from src.qna_with_data.context_builder import ContextBuilder, approximate_token_count
+
+
+BOOKING_ROW = {
+    'hotel': 'Resort Hotel', 'adults': 2, 'children': 1, 'babies': 0, 'market_segment': 'Online TA',
+    'distribution_channel': 'TA/TO', 'country': 'PRT', 'lead_time': 45, 'lead_time_bins': '1-2 months',
+    'arrival_date': '2016-05-14 00:00:00', 'year': 2016, 'month': 5, 'day': 14, 'arrival_date_week_number': 20,
+    'stays_in_week_nights': 3, 'stays_in_weekend_nights': 2, 'reserved_room_type': 'A', 'assigned_room_type': 'C',
+    'booking_changes': 1, 'previous_cancellations': 0, 'previous_bookings_not_canceled': 2, 'deposit_type': 'No Deposit',
+    'agent': 9.0, 'total_revenue': 512.5, 'adr': 102.5, 'reservation_status': 'Check-Out',
+    'reservation_status_date': '2016-05-19 00:00:00', 'total_of_special_requests': 1, 'required_car_parking_spaces': 0,
+    'customer_type': 'Transient', 'average_stay_duration': 5, 'is_canceled': 0, 'is_repeated_guest': 1,
+    'is_weekend_arrival': 1, 'is_holiday_season': 0, 'waiting_list_days': 0, 'days_in_waiting_list': 0,
+}
+
+
+def test_compact_text_parses_row_to_text():
+    assert compact_text(row_to_text(BOOKING_ROW)) == (
+        "hotel=Resort Hotel; guests=2A/1C/0B; segment=Online TA; channel=TA/TO; country=PRT; "
+        "lead_time=45d (1-2 months); arrival=2016-05-14 wk20; nights=3 weekday+2 weekend; room=A->C; changes=1; "
+        "prev_cancel=0; prev_ok=2; deposit=No Deposit; agent=9.0; revenue=512.5; adr=102.5; "
+        "status=Check-Out@2016-05-19; special_requests=1; parking=0; customer=Transient; canceled=no; "
+        "repeated=yes; weekend_arrival=yes; holiday=no; waiting_days=0"
+    )
+
+
+def test_compact_text_parses_the_pipeline_output():
+    # Rows produced by the real pre-processing, so a drift between row_to_text and the pattern shows up here
+    features, _ = build_features_for_rag(pre_process_data(generate_bookings(50, seed=0)))
+    texts = features.apply(row_to_text, axis=1)
+    assert all(BOOKING_TEXT_PATTERN.fullmatch(text) for text in texts)
+    assert all(compact_text(text).startswith("hotel=") for text in texts)
+
+
+def test_compact_text_leaves_other_text_alone():
+    assert compact_text("The overall cancellation rate  was\n0.37.") == "The overall cancellation rate was 0.37."
+
+
+def hit(text, vector_score=0.8):
+    return {"text": text, "vector_score": vector_score}
+
+
+def test_low_score_hits_are_dropped_keyword_only_hits_kept():
+    context, stats = ContextBuilder(min_score=0.5).build([
+        hit("Revenue in May 2016 was 100 USD."), hit("Unrelated passage.", 0.1), hit("Keyword only passage.", None)
+    ])
+    assert context == "[1] Revenue in May 2016 was 100 USD.\n[2] Keyword only passage."
+    assert stats["dropped_low_score"] == 1
+    assert stats["passages_used"] == 2
+    assert stats["passages_retrieved"] == 3
+
+
+def test_near_duplicates_are_dropped():
+    context, stats = ContextBuilder().build([
+        hit("The Resort Hotel had a total of 120 cancellations in 2016."),
+        hit("the resort hotel had a total of 120 cancellations in 2016."),
+        hit("The City Hotel had a total of 300 cancellations."),
+    ])
+    assert stats["dropped_duplicate"] == 1
+    assert stats["passages_used"] == 2
+    assert "City Hotel" in context
+
+
+def test_budget_truncates_the_best_passage_and_drops_later_ones():
+    builder = ContextBuilder(max_tokens=12)
+    context, stats = builder.build([
+        hit("one two three four five six seven eight nine ten eleven twelve thirteen fourteen"),
+        hit("another passage that does not fit"),
+    ])
+    assert context.startswith("[1] one two")
+    assert "another" not in context
+    assert stats["passages_used"] == 1
+    assert stats["dropped_budget"] == 1
+    assert stats["context_tokens"] == approximate_token_count(context) + 1 <= 12
+
+
+def test_passages_within_budget_are_all_used():
+    context, stats = ContextBuilder(max_tokens=100).build([hit("first passage."), hit("second passage.")])
+    assert stats["passages_used"] == 2
+    assert stats["dropped_budget"] == 0
+    assert stats["context_tokens"] == sum(approximate_token_count(line) + 1 for line in context.split("\n"))
+
+
+@pytest.mark.parametrize("max_tokens", [5, 20, 60])
+def test_context_never_exceeds_the_budget(max_tokens):
+    hits = [hit(f"passage {i} " + "word " * 15) for i in range(10)]
+    context, stats = ContextBuilder(max_tokens=max_tokens).build(hits)
+    assert stats["context_tokens"] <= max_tokens
+    assert sum(approximate_token_count(line) + 1 for line in context.split("\n") if line) <= max_tokens
@@ -0,0 +1,225 @@
+import time
+import threading
+
+import pytest
+
+from src.qna_with_data import llm_dispatcher
+from src.qna_with_data.llm_dispatcher import (
+    LLMDispatcher, StubBackend, TokenBucket, RateLimitError, QueueFullError, DeadlineExceededError
+)
+
+
+class BlockingBackend:
+    """
+    Backend whose calls wait until `release` is set, recording the prompts in call order.
+    """
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.prompts = []
+        self.lock = threading.Lock()
+
+
+    def complete(self, prompt, model):
+        with self.lock:
+            self.prompts.append(prompt)
+        self.started.set()
+        assert self.release.wait(5)
+        return f"answer to {prompt}"
+
+
+class FlakyBackend:
+    """
+    Backend failing with rate limit errors for the first `failures` calls.
+    """
+    def __init__(self, failures, retry_after=0.0):
+        self.failures = failures
+        self.retry_after = retry_after
+        self.calls = 0
+
+
+    def complete(self, prompt, model):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RateLimitError("quota exceeded", retry_after=self.retry_after)
+        return "ok"
+
+
+def unlimited(backend, **kwargs):
+    return LLMDispatcher(backend, requests_per_minute=None, tokens_per_minute=None, **kwargs)
+
+
+@pytest.fixture
+def no_jitter(monkeypatch):
+    # Backoff of attempt n is exactly 2**n * 0.5 seconds
+    monkeypatch.setattr(llm_dispatcher.random, "random", lambda: 0.0)
+
+
+def test_identical_in_flight_requests_share_one_call():
+    backend = BlockingBackend()
+    dispatcher = unlimited(backend)
+    futures = [dispatcher.submit("same prompt", "m") for _ in range(10)]
+    assert backend.started.wait(5)
+    backend.release.set()
+
+    assert {f.result(5) for f in futures} == {"answer to same prompt"}
+    assert backend.prompts == ["same prompt"]
+
+
+def test_requests_are_not_coalesced_across_models_or_after_completion():
+    backend = StubBackend(latency=0)
+    dispatcher = unlimited(backend)
+    dispatcher.complete("prompt", "a")
+    dispatcher.complete("prompt", "b")
+    dispatcher.complete("prompt", "a")
+    assert backend.calls == 3
+    assert dispatcher.in_flight == {}
+
+
+def test_coalesced_request_extends_the_deadline():
+    dispatcher = unlimited(StubBackend(latency=0), workers=0) # nothing is dispatched, jobs stay queued
+    dispatcher.submit("prompt", "m", timeout=1)
+    job = dispatcher.in_flight[("m", "prompt")]
+    first_deadline = job.deadline
+
+    dispatcher.submit("prompt", "m", timeout=60)
+    assert job.deadline > first_deadline + 50
+    # A shorter deadline does not shorten it
+    dispatcher.submit("prompt", "m", timeout=1)
+    assert job.deadline > first_deadline + 50
+    # Without a deadline, the shared job has none either
+    dispatcher.submit("prompt", "m")
+    assert job.deadline is None
+
+
+def test_queue_full_raises():
+    dispatcher = unlimited(StubBackend(latency=0), workers=0, max_queue=2)
+    dispatcher.submit("a", "m")
+    dispatcher.submit("b", "m")
+    dispatcher.submit("a", "m") # coalesced, does not take a queue slot
+    with pytest.raises(QueueFullError):
+        dispatcher.submit("c", "m")
+
+
+def test_lower_priority_number_is_dispatched_first():
+    backend = BlockingBackend()
+    dispatcher = unlimited(backend, workers=1)
+    blocker = dispatcher.submit("blocker", "m")
+    assert backend.started.wait(5)
+    low = dispatcher.submit("low", "m", priority=5)
+    high = dispatcher.submit("high", "m", priority=0)
+    backend.release.set()
+
+    for future in (blocker, low, high):
+        future.result(5)
+    assert backend.prompts == ["blocker", "high", "low"]
+
+
+def test_request_expired_in_the_queue_is_not_sent():
+    backend = BlockingBackend()
+    dispatcher = unlimited(backend, workers=1)
+    blocker = dispatcher.submit("blocker", "m")
+    assert backend.started.wait(5)
+    expiring = dispatcher.submit("expiring", "m", timeout=0.05)
+    time.sleep(0.1)
+    backend.release.set()
+
+    blocker.result(5)
+    with pytest.raises(DeadlineExceededError):
+        expiring.result(5)
+    assert backend.prompts == ["blocker"]
+
+
+def test_rate_limited_request_fails_fast_past_its_deadline():
+    backend = StubBackend(latency=0)
+    dispatcher = LLMDispatcher(backend, requests_per_minute=1, tokens_per_minute=None)
+    dispatcher.complete("first", "m", timeout=1)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        dispatcher.complete("second", "m", timeout=1)
+    assert time.monotonic() - start < 0.5
+    assert backend.calls == 1
+
+
+def test_token_bucket_reserve_and_refund():
+    bucket = TokenBucket(rate=1, capacity=10)
+    assert bucket.reserve(4) == 0
+    with pytest.raises(DeadlineExceededError):
+        bucket.reserve(20, deadline=time.monotonic() + 1) # clipped to the capacity, still 4s away
+    assert bucket.tokens == pytest.approx(6, abs=0.1) # nothing taken by the rejected reservation
+    bucket.refund(4)
+    assert bucket.tokens == pytest.approx(10, abs=0.1)
+    bucket.refund(4)
+    assert bucket.tokens == pytest.approx(10, abs=0.1) # never above the capacity
+
+
+def test_request_token_is_refunded_when_the_token_bucket_rejects():
+    dispatcher = LLMDispatcher(
+        StubBackend(latency=0), requests_per_minute=60, tokens_per_minute=300, completion_tokens=256
+    )
+    dispatcher.complete("short", "m", timeout=1)
+    with pytest.raises(DeadlineExceededError):
+        dispatcher.complete("x" * 400, "m", timeout=1) # needs ~357 tokens, more than are left
+    assert dispatcher.request_bucket.tokens == pytest.approx(59, abs=0.1)
+
+
+def test_rate_limit_errors_are_retried(no_jitter):
+    backend = FlakyBackend(failures=1)
+    dispatcher = unlimited(backend, max_retries=2)
+    start = time.monotonic()
+    assert dispatcher.complete("prompt", "m") == "ok"
+    assert backend.calls == 2
+    assert time.monotonic() - start >= 0.5 # backoff of the first retry
+
+
+def test_retries_stop_after_max_retries(no_jitter):
+    backend = FlakyBackend(failures=5)
+    dispatcher = unlimited(backend, max_retries=1)
+    with pytest.raises(RateLimitError):
+        dispatcher.complete("prompt", "m")
+    assert backend.calls == 2
+
+
+def test_retry_waits_at_least_retry_after_within_the_deadline(no_jitter):
+    backend = FlakyBackend(failures=1, retry_after=30)
+    dispatcher = unlimited(backend)
+    with pytest.raises(DeadlineExceededError):
+        dispatcher.complete("prompt", "m", timeout=1)
+    assert backend.calls == 1
+
+
+def test_other_errors_are_not_retried():
+    class FailingBackend:
+        calls = 0
+        def complete(self, prompt, model):
+            self.calls += 1
+            raise RuntimeError("boom")
+
+    backend = FailingBackend()
+    with pytest.raises(RuntimeError, match="boom"):
+        unlimited(backend).complete("prompt", "m")
+    assert backend.calls == 1
+
+
+def test_caller_stops_waiting_after_its_timeout():
+    backend = BlockingBackend()
+    dispatcher = unlimited(backend)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        dispatcher.complete("slow", "m", timeout=0.2)
+    assert time.monotonic() - start < 1
+    backend.release.set()
+
+
+def test_coalesced_caller_keeps_its_own_timeout():
+    backend = BlockingBackend()
+    dispatcher = unlimited(backend)
+    shared = dispatcher.submit("prompt", "m") # in flight without a deadline
+    assert backend.started.wait(5)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        dispatcher.complete("prompt", "m", timeout=0.2)
+    assert time.monotonic() - start < 1
+    backend.release.set()
+    assert shared.result(5) == "answer to prompt" # the shared call is not cancelled
+    assert backend.prompts == ["prompt"]
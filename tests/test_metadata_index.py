@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.qna_with_data.metadata_index import MetadataIndex, normalize_filter_value, to_pinecone_filter
+
+
+@pytest.fixture
+def index():
+    corpus = pd.DataFrame({
+        "doc_type": ["global_metric", "booking", "booking", "booking"],
+        "year": [2016, 2016, 2016.0, 2017],
+        "month": [5, 5, 9, np.nan],
+        "hotel": [np.nan, "Resort Hotel", "City Hotel", "Resort Hotel"],
+    })
+    return MetadataIndex.build(corpus, ["doc_type", "year", "month", "hotel"])
+
+
+@pytest.mark.parametrize("value, expected", [(5, 5), ("5", 5), (5.0, 5), ("May", 5), ("may", 5), (" Sep ", 9), ("september", 9)])
+def test_month_names_and_numbers(value, expected):
+    assert normalize_filter_value("month", value) == expected
+
+
+@pytest.mark.parametrize("value", ["Mayo", "13", 0, 5.5, None])
+def test_invalid_month_raises(value):
+    with pytest.raises(ValueError):
+        normalize_filter_value("month", value)
+
+
+def test_other_attributes_are_unchanged():
+    assert normalize_filter_value("hotel", "May") == "May"
+
+
+def test_lookup(index):
+    assert index.lookup({"month": "May"}).tolist() == [0, 1]
+    assert index.lookup({"year": "2016", "month": ["may", 9]}).tolist() == [0, 1, 2]
+    assert index.lookup({"doc_type": "global_metric", "year": 2016}).tolist() == [0]
+    assert index.lookup({"hotel": "Resort Hotel", "year": 2016.0}).tolist() == [1]
+    with pytest.raises(ValueError):
+        index.lookup({"month": "Mayo"})
+    with pytest.raises(ValueError):
+        index.lookup({"agent": 9})
+
+
+def test_pinecone_filter_uses_stored_types():
+    assert to_pinecone_filter({"month": "May", "year": "2016", "hotel": ["City Hotel"]}) == {
+        "month": {"$eq": 5}, "year": {"$eq": 2016}, "hotel": {"$in": ["City Hotel"]}
+    }
+    with pytest.raises(ValueError):
+        to_pinecone_filter({"month": "Mayo"})
@@ -0,0 +1,107 @@
+import time
+
+import pandas as pd
+import pytest
+
+from src.qna_with_data.sql_engine import SQLEngine, extract_sql, validate_sql, normalize_question
+from src.qna_with_data.llm_dispatcher import LLMDispatcher
+
+
+class FixedBackend:
+    """
+    Backend answering every prompt with the same text.
+    """
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = 0
+
+
+    def complete(self, prompt, model):
+        self.calls += 1
+        return self.answer
+
+
+def make_engine(answer="SELECT 1", **kwargs):
+    bookings = pd.DataFrame({
+        "hotel": ["Resort Hotel", "City Hotel"] * 50, "country": ["PRT", "a;b"] * 50, "is_canceled": [0, 1] * 50
+    })
+    backend = FixedBackend(answer)
+    dispatcher = LLMDispatcher(backend, requests_per_minute=None, tokens_per_minute=None)
+    return SQLEngine(bookings, llm_dispatcher=dispatcher, **kwargs), backend
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM bookings",
+    "select count(*) from bookings where country = 'a;b'",
+    "WITH c AS (SELECT hotel FROM bookings) SELECT * FROM c",
+    'SELECT "x;y" FROM bookings',
+    "SELECT 1;",
+    "SELECT 1;  \n",
+])
+def test_valid_sql(sql):
+    validate_sql(sql)
+
+
+@pytest.mark.parametrize("sql, message", [
+    ("DELETE FROM bookings", "SELECT"),
+    ("The answer is 42.", "SELECT"),
+    ("DROP TABLE bookings; SELECT 1", "SELECT"),
+    ("SELECT 1; DROP TABLE bookings", "single"),
+    ("SELECT ';'; DELETE FROM bookings", "single"),
+])
+def test_invalid_sql(sql, message):
+    with pytest.raises(ValueError, match=message):
+        validate_sql(sql)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("SELECT 1;", "SELECT 1"),
+    ("```sql\nSELECT hotel FROM bookings;\n```", "SELECT hotel FROM bookings"),
+    ("```SQL\nSELECT 1\n```", "SELECT 1"),
+    ("Here is the query:\n```\nSELECT 2\n```\nIt counts rows.", "SELECT 2"),
+    ("  SELECT 3 ; ", "SELECT 3"),
+])
+def test_extract_sql(text, expected):
+    assert extract_sql(text) == expected
+
+
+def test_normalize_question():
+    assert normalize_question("  What is the Cancellation rate? ") == normalize_question("what is the cancellation  rate")
+
+
+def test_ask_runs_the_generated_query_and_caches_it():
+    engine, backend = make_engine("```sql\nSELECT COUNT(*) FROM bookings WHERE country = 'a;b';\n```")
+    for question in ("How many bookings from a;b?", "how many bookings from a;b"):
+        assert engine.ask(question) == {
+            "sql": "SELECT COUNT(*) FROM bookings WHERE country = 'a;b'", "columns": ["COUNT(*)"], "rows": [[50]]
+        }
+    assert backend.calls == 1
+
+
+def test_unusable_generated_sql_is_an_answer_error():
+    engine, _ = make_engine("I cannot answer that.")
+    result = engine.ask("question")
+    assert result["sql"] == "I cannot answer that."
+    assert "usable query" in result["error"]
+    assert engine.sql_cache == {}
+
+
+def test_writes_are_refused_by_the_connections():
+    engine, _ = make_engine()
+    with pytest.raises(Exception, match="readonly"):
+        with engine.connection() as connection:
+            connection.execute("WITH c AS (SELECT 1) DELETE FROM bookings")
+
+
+def test_long_query_is_interrupted():
+    engine, _ = make_engine(
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n", pool_size=1,
+        query_timeout=0.3
+    )
+    start = time.monotonic()
+    result = engine.ask("count forever")
+    assert time.monotonic() - start < 2
+    assert "time limit" in result["error"]
+    assert engine.sql_cache == {}
+    # The pooled connection is usable afterwards
+    assert engine.run_sql("SELECT COUNT(*) FROM bookings")["rows"] == [[100]]